@@ -1,9 +1,9 @@
 import os
 import subprocess
-import json
 import argparse
 import statistics
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from wisq.schedule_file import read_summary
 
 # === CLI ===
 parser = argparse.ArgumentParser(description="Run WISQ benchmarks in parallel")
@@ -90,18 +90,14 @@ def run_and_stream(cmd, env, log_path):
     return p.returncode == 0
 
 def load_steps(path):
-    """Load number of steps from JSON output (if exists)."""
+    """Load number of steps from the result (if exists), see read_summary."""
     if not os.path.exists(path):
         return None
     try:
-        with open(path) as f:
-            data = json.load(f)
-        steps = data.get("steps")
-        if steps == "timeout":
-            return None
-        return len(steps)
+        steps = read_summary(path)["steps"]
     except:
         return None
+    return steps if isinstance(steps, int) else None
 
 def run_wisq_case(bench_path, bench_name, case_name, hbm_config, extra_wisq_args, run_idx):
     """Single benchmark/architecture run."""
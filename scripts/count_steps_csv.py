@@ -1,10 +1,10 @@
 import os
 import subprocess
-import json
 import argparse
 import statistics
 from collections import defaultdict
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from wisq.schedule_file import read_summary
 import csv
 
 # === CLI ===
@@ -71,34 +71,19 @@ def run_and_stream(cmd, env, log_path):
     return p.returncode == 0
 
 def load_steps(path):
-    """Load number of steps from JSON output (if exists)."""
+    """Load number of steps from the result (if exists), see read_summary."""
     if not os.path.exists(path):
         return None
     try:
-        with open(path) as f:
-            data = json.load(f)
-        steps = data.get("steps")
-        if steps == "timeout":
-            return None
-        return len(steps)
+        steps = read_summary(path)["steps"]
     except:
         return None
+    return steps if isinstance(steps, int) else None
 
 def load_footprint(path):
     """Load max number of occupied ancilla of any timestep."""
-    with open(path, 'r') as f:
-        data = json.load(f)
-    steps = data.get("steps")
-    if steps == "timeout":
-        return None
-    max_occupied = 0
-    for timestep in data["steps"]:
-        # Sum lengths of "path" lists for all operations in this timestep
-        occupied = sum(len(op["path"]) for op in timestep)
-        print(occupied)
-        max_occupied = max(max_occupied, occupied)
-
-    return max_occupied
+    # the summed path lengths of the fullest timestep, see read_summary
+    return read_summary(path).get("max_step_path_length")
 
 def run_wisq_case(bench_path, bench_name, case_name, hbm_config, extra_wisq_args, run_idx):
     """Single benchmark/architecture run."""
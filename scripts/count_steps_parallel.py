@@ -1,5 +1,6 @@
-import os, subprocess, json, argparse, statistics
+import os, subprocess, argparse, statistics
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from wisq.schedule_file import read_summary
 
 # === Command-line arguments ===
 parser = argparse.ArgumentParser(description="Run WISQ benchmarks for hbm and magic states.")
@@ -38,16 +39,12 @@ def run_command(cmd, env):
 
 
 def count_steps(filepath):
-    """Count number of steps in JSON result."""
+    """Count number of steps in the result, see read_summary."""
     if not os.path.exists(filepath):
         return None
     try:
-        with open(filepath) as f:
-            data = json.load(f)
-            steps = data.get("steps", [])
-            if steps == "timeout":
-                return None
-        return len(steps)
+        steps = read_summary(filepath)["steps"]
+        return steps if isinstance(steps, int) else None
     except Exception as e:
         print(f"⚠️ Could not parse {filepath}: {e}")
         return None
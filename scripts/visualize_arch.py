@@ -4,6 +4,7 @@ import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import matplotlib.lines as mlines
+from wisq.schedule_file import SCHEDULE_SUFFIX, ScheduleReader
 
 # Use an interactive backend
 matplotlib.use("Qt5Agg")
@@ -143,8 +144,13 @@ def main():
         sys.exit(1)
 
     path = sys.argv[1]
-    with open(path, "r") as f:
-        data = json.load(f)
+    if path.endswith(SCHEDULE_SUFFIX):
+        # steps are read from the schedule file as they are shown
+        reader = ScheduleReader(path)
+        data = {"arch": reader.arch, "map": reader.map, "steps": reader}
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
 
     visualize_steps(data)
 
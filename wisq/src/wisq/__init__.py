@@ -1,7 +1,6 @@
 import argparse
 import ast
-from qiskit import QuantumCircuit
-from .architecture import square_sparse_layout, compact_layout
+from .architecture import Architecture, square_sparse_layout, compact_layout
 from .dascot import (
     extract_gates_from_file,
     extract_qubits_from_gates,
@@ -9,11 +8,14 @@ from .dascot import (
     run_dascot,
     run_sat_scmr,
 )
+from .qasm_parser import parse_qasm
+from .schedule_file import SCHEDULE_SUFFIX
 from .guoq import run_guoq, print_help, CLIFFORDT, FAULT_TOLERANT_OPTIMIZATION_OBJECTIVE
 from .utils import create_scratch_dir
 import os
 import shutil
 import json
+import time
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
@@ -98,7 +100,17 @@ def visualize_architecture(arch, filename):
 
 
 def map_and_route(
-    input_path: str, arch_name: str, output_path: str, timeout: int, mode="dascot", visualize=None
+    input_path: str,
+    arch_name: str,
+    output_path: str,
+    timeout: int,
+    mode="dascot",
+    visualize=None,
+    workers: int = 1,
+    search="incremental",
+    fix_map=False,
+    window=None,
+    solver="cd",
 ):
     """
     Apply a surface code mapping and routing pass to the given circuit
@@ -110,16 +122,25 @@ def map_and_route(
         strings "square_sparse_layout" or "compact_layout" representing built-in architectures,
         or the path to a text file containing the description of a custom architecture
         timeout: Total timeout in seconds for both mapping and routing.
+        workers: Number of worker processes for DASCOT. Mapping runs one parallel tempering
+        replica per worker and routing runs one independent chain per worker, keeping the
+        schedule with the fewest steps.
+        search, fix_map, window, solver: options of the "sat" mode, see run_sat_scmr.
+        search is "incremental", "rebuild", "binary" or "portfolio", fix_map keeps the
+        DASCOT placement, window solves the circuit that many dependency layers at a
+        time and solver is the pysat solver name ("cd" CaDiCaL, "g4" Glucose).
 
 
     Writes a JSON representing
-    the scheduled circuit after mapping and routing to output_path.
+    the scheduled circuit after mapping and routing to output_path, or a compact
+    binary schedule if output_path ends in .wsch (see schedule_file.ScheduleReader).
+    A summary with the step count and run metadata goes to output_path + ".summary".
     """
-    circ = QuantumCircuit.from_qasm_file(input_path)
-    gates, ops = extract_gates_from_file(input_path)
+    start = time.time()
+    circ = parse_qasm(input_path)
+    gates, ops = circ.gates, circ.ops
     id_to_op = {i: ops[i] for i in range(len(ops))}
     total_qubits = len(extract_qubits_from_gates(gates))
-    circ = QuantumCircuit.from_qasm_file(input_path)
 
     if arch_name == "square_sparse_layout":
         layout_fn = square_sparse_layout
@@ -138,6 +159,8 @@ def map_and_route(
         arch = layout_fn(total_qubits, magic_states="single_magic_state")
     else:
         arch = layout_fn(total_qubits, magic_states="all_sides")
+    # adjacency, coordinates and factory distances are computed once for all stages
+    arch = Architecture.from_dict(arch)
     
     # else:
     #     with open(arch_name) as f:
@@ -146,10 +169,37 @@ def map_and_route(
         print(f"saving visualization of arch at {visualize}")
         visualize_architecture(arch, visualize)
     if mode == "dascot":
-        map, steps = run_dascot(circ, gates, arch, output_path, timeout)
+        # routed steps go straight to a schedule file instead of being kept
+        map, steps, annealing = run_dascot(
+            circ,
+            gates,
+            arch,
+            timeout,
+            workers=workers,
+            stream=output_path.endswith(SCHEDULE_SUFFIX),
+        )
     elif mode == "sat":
-        map, steps = run_sat_scmr(circ, gates, arch, output_path, timeout)
-    dump(arch, map, steps, id_to_op, output_path, gates)
+        map, steps, annealing = run_sat_scmr(
+            circ,
+            gates,
+            arch,
+            timeout,
+            search=search,
+            fix_map=fix_map,
+            window=window,
+            solver=solver,
+        )
+    metadata = {
+        "input": input_path,
+        "mode": mode,
+        "arch": arch_name,
+        "hbm_config": HBM_CONFIG,
+        "timeout": timeout,
+        "workers": workers,
+    }
+    if mode == "sat":
+        metadata.update(search=search, fix_map=fix_map, window=window, solver=solver)
+    dump(arch, map, steps, id_to_op, output_path, gates, annealing, metadata, start)
 
 
 def optimize(
@@ -199,6 +249,12 @@ def compile_fault_tolerant(
     mr_timeout=1800,
     mr_solver="dascot",
     path_to_synthetiq=None,
+    mr_workers=1,
+    visualize=None,
+    mr_search="incremental",
+    mr_fix_map=False,
+    mr_window=None,
+    mr_sat_solver="cd",
 ):
     """
     Compiles a circuit to a fault-tolerant architecture using the Clifford + T gate set.
@@ -234,6 +290,11 @@ def compile_fault_tolerant(
             mr_timeout,
             mode=mr_solver,
             visualize=visualize,
+            workers=mr_workers,
+            search=mr_search,
+            fix_map=mr_fix_map,
+            window=mr_window,
+            solver=mr_sat_solver,
         )
     finally:
         if os.path.exists(scratch_dir_path):
@@ -321,6 +382,38 @@ def main():
         help="solver to use for mapping and routing (default: 'dascot')",
         default="dascot",
     )
+    scmr.add_argument(
+        "--mr_workers",
+        "-wmr",
+        type=int,
+        help="number of worker processes for DASCOT: parallel tempering replicas for mapping and independent routing chains, keeping the schedule with the fewest steps (default: 1)",
+        default=1,
+    )
+    scmr.add_argument(
+        "--mr_search",
+        "-srmr",
+        help="step count search of the 'sat' solver: one solver tried at increasing step counts, a new CNF per step count, galloping/bisection bounded by a DASCOT run, or a portfolio of solvers racing (default: 'incremental')",
+        default="incremental",
+        choices=["incremental", "rebuild", "binary", "portfolio"],
+    )
+    scmr.add_argument(
+        "--mr_fix_map",
+        "-fmr",
+        help="for the 'sat' solver, keep the placement of a DASCOT run and only optimize the routing",
+        action="store_true",
+    )
+    scmr.add_argument(
+        "--mr_window",
+        "-wnmr",
+        type=int,
+        help="for the 'sat' solver, solve the circuit this many dependency layers at a time instead of all at once",
+    )
+    scmr.add_argument(
+        "--mr_sat_solver",
+        "-ssmr",
+        help="pysat solver of the 'sat' solver, e.g. 'cd' (CaDiCaL) or 'g4' (Glucose) (default: 'cd')",
+        default="cd",
+    )
     parser.add_argument(
         "--guoq_help", "-gh", help="print GUOQ options", action=Guoq_Help_Action
     )
@@ -373,6 +466,11 @@ def main():
             mr_solver=args.mr_solver,
             path_to_synthetiq=args.abs_path_to_synthetiq,
             visualize=args.visualize_architecture,
+            mr_workers=args.mr_workers,
+            mr_search=args.mr_search,
+            mr_fix_map=args.mr_fix_map,
+            mr_window=args.mr_window,
+            mr_sat_solver=args.mr_sat_solver,
         )
     elif args.mode == SCMR_MODE:
         map_and_route(
@@ -382,6 +480,11 @@ def main():
             timeout=args.mr_timeout,
             mode=args.mr_solver,
             visualize=args.visualize_architecture,
+            workers=args.mr_workers,
+            search=args.mr_search,
+            fix_map=args.mr_fix_map,
+            window=args.mr_window,
+            solver=args.mr_sat_solver,
         )
 
 
@@ -1,5 +1,6 @@
 import math
 import os
+import numpy as np
 
 HBM_CONFIG = os.getenv("HBM_CONFIG", "NO_CONFIG")
 
@@ -231,4 +232,136 @@ def horizontal_neighbors(n, grid_len, grid_height, omitted_edges):
         neighbors.append(left)
     if n % grid_len != grid_len-1 and (n,right) not in omitted_edges and (right,n) not in omitted_edges:
         neighbors.append(right)
-    return neighbors
\ No newline at end of file
+    return neighbors
+
+
+def nearest_magic_states(magic_states, grid_len, grid_height):
+    """For every tile, the magic-state factories sorted by Manhattan distance to it.
+
+    Row n of the returned array lists the factories nearest first, with ties
+    kept in the order of magic_states.
+    """
+    msf = np.asarray(magic_states, dtype=np.int32).reshape(-1)
+    tiles = np.arange(grid_len * grid_height, dtype=np.int32)
+    dist = np.abs(tiles[:, None] % grid_len - msf[None, :] % grid_len) + np.abs(
+        tiles[:, None] // grid_len - msf[None, :] // grid_len
+    )
+    return msf[np.argsort(dist, axis=1, kind="stable")]
+
+
+class Architecture:
+    """
+    A layout dict (height, width, alg_qubits, magic_states) with what the mapper,
+    router and SAT encoding derive from it computed once: the x and y of every tile,
+    is_data / is_magic / is_ancilla masks, the horizontal, vertical and all neighbors
+    of every tile (as horizontal_neighbors + vertical_neighbors, without the
+    omitted_edges), the factories of every tile nearest first (nearest_magic_states)
+    and distance. Indexing by the dict keys still works, so an Architecture can be
+    passed wherever a layout dict is expected; to_dict gives the dict back.
+    """
+
+    __slots__ = (
+        "width",
+        "height",
+        "alg_qubits",
+        "magic_states",
+        "omitted_edges",
+        "x",
+        "y",
+        "is_data",
+        "is_magic",
+        "is_ancilla",
+        "horizontal",
+        "vertical",
+        "neighbors",
+        "nearest_msf",
+        "distances",
+    )
+    KEYS = ("height", "width", "alg_qubits", "magic_states")
+
+    def __init__(self, width, height, alg_qubits=(), magic_states=(), omitted_edges=()):
+        self.width = width
+        self.height = height
+        self.alg_qubits = list(alg_qubits)
+        self.magic_states = list(magic_states)
+        self.omitted_edges = set(omitted_edges)
+        self.omitted_edges |= {(v, u) for u, v in self.omitted_edges}
+        tiles = np.arange(width * height, dtype=np.int32)
+        self.x = tiles % width
+        self.y = tiles // width
+        self.is_data = np.zeros(len(tiles), dtype=bool)
+        self.is_data[self.alg_qubits] = True
+        self.is_magic = np.zeros(len(tiles), dtype=bool)
+        self.is_magic[self.magic_states] = True
+        self.is_ancilla = ~(self.is_data | self.is_magic)
+        self.horizontal = [
+            tuple(horizontal_neighbors(n, width, height, self.omitted_edges))
+            for n in range(len(tiles))
+        ]
+        self.vertical = [
+            tuple(vertical_neighbors(n, width, height, self.omitted_edges))
+            for n in range(len(tiles))
+        ]
+        self.neighbors = [h + v for h, v in zip(self.horizontal, self.vertical)]
+        self.nearest_msf = nearest_magic_states(self.magic_states, width, height)
+        self.distances = None
+
+    @classmethod
+    def from_dict(cls, arch, omitted_edges=()):
+        return cls(
+            arch["width"],
+            arch["height"],
+            arch["alg_qubits"],
+            arch["magic_states"],
+            omitted_edges,
+        )
+
+    def to_dict(self):
+        return {key: self[key] for key in self.KEYS}
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    @property
+    def size(self):
+        return self.width * self.height
+
+    def coords(self, n):
+        """(x, y) of tile n."""
+        return n % self.width, n // self.width
+
+    def distance(self, a, b):
+        """
+        Length of the shortest path between tiles a and b (ints or index arrays):
+        the Manhattan distance, or over the grid without the omitted edges if there
+        are any (all pairs by breadth first search on first use, -1 if unreachable).
+        """
+        if not self.omitted_edges:
+            return np.abs(self.x[a] - self.x[b]) + np.abs(self.y[a] - self.y[b])
+        if self.distances is None:
+            self.distances = np.full((self.size, self.size), -1, dtype=np.int32)
+            for source in range(self.size):
+                row = self.distances[source]
+                row[source] = 0
+                frontier = [source]
+                while frontier:
+                    next_frontier = []
+                    for u in frontier:
+                        for v in self.neighbors[u]:
+                            if row[v] < 0:
+                                row[v] = row[u] + 1
+                                next_frontier.append(v)
+                    frontier = next_frontier
+        return self.distances[a, b]
+
+
+def as_architecture(arch):
+    """arch as an Architecture, built from it if it is a layout dict."""
+    if isinstance(arch, Architecture):
+        return arch
+    return Architecture.from_dict(arch)
@@ -2,6 +2,7 @@ import os
 import json
 import sys
 from collections import defaultdict
+from wisq.schedule_file import read_summary
 
 
 def count_steps(filepath):
@@ -12,10 +13,7 @@ def count_steps(filepath):
         return None
 
     try:
-        with open(abs_path, "r") as f:
-            data = json.load(f)
-
-        steps = data.get("steps", None)
+        steps = read_summary(abs_path)["steps"]
         if steps is None:
             print(f"⚠️ No 'steps' field in {abs_path}")
             return None
@@ -24,8 +22,8 @@ def count_steps(filepath):
             print(f"⚠️ Timeout encountered in {abs_path}")
             return None
 
-        if isinstance(steps, list):
-            return len(steps)
+        if isinstance(steps, int):
+            return steps
 
         print(f"⚠️ Unexpected 'steps' type in {abs_path}: {type(steps)}")
         return None
@@ -1,19 +1,16 @@
 import json
+import random
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from .architecture import Architecture, as_architecture
+from .lower_bounds import optimality_gap, step_lower_bound
 from .phased_graph import build_phased_map
-from .sarouting import sim_anneal_route
-from .sat_scmr import solve
-import signal
-
-
-class TimeoutException(Exception):
-    """Custom exception to handle routing timeout."""
-
-    pass
-
-def timeout_handler(signum, frame):
-    """Signal handler for routing timeout."""
-    raise TimeoutException("Routing timed out")
+from .schedule_file import SCHEDULE_SUFFIX, ScheduleWriter, summarize, write_summary
+from .sarouting import HBM_ARCH, route_steps, sim_anneal_route
+from .sat_scmr import solve, solve_windowed
 
 def extract_gates_from_file(fname):
     gates = []
@@ -39,12 +36,53 @@ def extract_qubits_from_gates(gate_list):
     return qubits
 
 
-def dump(arch, map, steps, id_to_op, output_path, gates):
+def dump(
+    arch,
+    map,
+    steps,
+    id_to_op,
+    output_path,
+    gates,
+    annealing=None,
+    metadata=None,
+    start=None,
+):
+    """
+    Write the schedule to output_path, as JSON or, for paths ending in
+    SCHEDULE_SUFFIX, as a schedule file. steps may be an iterator (see run_dascot
+    with stream), a schedule file then gets every step as it comes out, with
+    annealing[k] read once step k has. A summary (see summarize, with metadata
+    about the run) is written next to it for read_summary; start, the time.time()
+    the run began, adds its "seconds" to metadata once the schedule is written.
+    """
+    if isinstance(arch, Architecture):
+        arch = arch.to_dict()
+    if output_path.endswith(SCHEDULE_SUFFIX):
+        ops = [id_to_op[id] for id in range(len(gates))]
+        with ScheduleWriter(output_path, arch, map, gates, ops) as writer:
+            for k, step in enumerate(steps):
+                writer.write_step(step, None if annealing is None else annealing[k])
+        summary = writer.summary()
+    else:
+        steps = list(steps)
+        write_json(arch, map, steps, id_to_op, output_path, gates, annealing)
+        summary = summarize(map, steps, gates, annealing)
+    if start is not None:
+        metadata = dict(metadata or {}, seconds=round(time.time() - start, 3))
+    if metadata is not None:
+        summary["metadata"] = metadata
+    write_summary(output_path, summary)
+
+
+def write_json(arch, map, steps, id_to_op, output_path, gates, annealing):
     output = {}
     output["map"] = {k: v for k, v in map}
     output["steps"] = [label_step(id_to_op, step) for step in steps]
+    if annealing is not None:
+        # routing orders tried per step, 0 where DASCOT routed greedily at the deadline
+        output["annealing"] = annealing
     output["arch"] = arch
-    output["gates"] = gates
+    output["gates"] = list(gates)
     with open(output_path, "w") as f:
         json.dump(output, f, indent=4)
 
@@ -62,9 +100,101 @@ def labeled_gate_path(id_to_op, id, args, path):
     return dict
 
 
-def run_dascot(circ, gates, arch, output_path, timeout):
+# circuit, architecture and mapping shared by the routing chains of a worker process
+route_chain_shared = {}
+
+
+def init_route_worker(gates, arch, mapping):
+    route_chain_shared["gates"] = gates
+    route_chain_shared["arch"] = arch
+    route_chain_shared["mapping"] = mapping
+
+
+def route_chain(seed, deadline, route_kwargs):
+    """Run one whole-circuit routing chain in a worker."""
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    return sim_anneal_route(
+        route_chain_shared["gates"],
+        route_chain_shared["arch"],
+        route_chain_shared["mapping"],
+        deadline=deadline,
+        **route_kwargs,
+    )
+
+
+def sim_anneal_route_parallel(gates, arch, mapping, workers, timeout, **route_kwargs):
+    """
+    Run `workers` independent routing chains with different seeds in a process pool
+    and keep the schedule with the fewest steps. Each chain anneals for `timeout`
+    seconds and routes whatever is left greedily, see sim_anneal_route.
+    """
+    seeds = [random.randrange(2**32) for _ in range(workers)]
+    deadline = time.time() + timeout
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_route_worker,
+        initargs=(gates, arch, mapping),
+    ) as pool:
+        results = list(
+            pool.map(route_chain, seeds, repeat(deadline), repeat(route_kwargs))
+        )
+    return min(results, key=lambda result: len(result[0]))
+
+
+def dascot_lower_bound(gates, arch, phased_map):
+    """
+    Lower bound on the steps of any DASCOT schedule on phased_map. DASCOT ends T
+    braids next to a factory, so each free horizontal neighbor of a factory serves
+    one T gate per step, and only NO_HBM routes T gates (and CNOTs around factories)
+    on the device plane.
+    """
+    arch = as_architecture(arch)
+    msf = arch.magic_states
+    t_capacity = sum(not arch.is_magic[n] for m in msf for n in arch.horizontal[m])
+    return step_lower_bound(
+        gates,
+        arch,
+        phased_map,
+        t_capacity=t_capacity,
+        count_t=HBM_ARCH == "NO_HBM",
+        blocked=msf if HBM_ARCH == "NO_HBM" else (),
+    )
+
+
+def report_routing(gates, arch, phased_map, num_steps, annealing):
+    greedy = annealing.count(0)
+    if greedy:
+        print(f"Routing timed out, {greedy} of {num_steps} steps routed greedily")
+    lower_bound = dascot_lower_bound(gates, arch, phased_map)
+    print(
+        f"DASCOT: {num_steps} steps, lower bound {lower_bound} "
+        f"(gap {optimality_gap(num_steps, lower_bound):.0%})"
+    )
+
+
+def streamed_route(gates, arch, phased_map, annealing, **route_kwargs):
+    """
+    The steps of sim_anneal_route, each routed when it is asked for. The routing
+    orders tried for it are appended to annealing before it is yielded, and the
+    routing is reported once the last one is out.
+    """
+    for step, tried in route_steps(gates, arch, phased_map, **route_kwargs):
+        annealing.append(tried)
+        yield step
+    report_routing(gates, arch, phased_map, len(annealing), annealing)
+
+
+def run_dascot(circ, gates, arch, timeout, workers=1, stream=False):
+    """
+    Map with the phased graph of circ (a QasmCircuit, see parse_qasm) and route gates
+    by simulated annealing, giving each of them half of the budget. With stream
+    (and one worker) the steps come back as an iterator that routes them as they
+    are consumed, filling in the annealing list as it goes, so that dump can write
+    each one out without the schedule being kept.
+    """
     sim_anneal_params = [100, 0.1, 0.1]
-    depth = circ.depth(filter_function=lambda x: x[0].name in ["cx", "t", "tdg"])
+    depth = circ.depth
     scaled_sim_anneal_params = [
         sim_anneal_params[0],
         sim_anneal_params[1] / depth,
@@ -76,54 +206,113 @@ def run_dascot(circ, gates, arch, output_path, timeout):
         arch,
         include_t=True,
         timeout=timeout // 2,
+        workers=workers,
         *scaled_sim_anneal_params,
     )
+    route_kwargs = dict(
+        temperature=10,
+        cooling_rate=0.1,
+        termination_temp=0.1,
+        reward_name="criticality",
+        order_fraction=1,
+        take_first_ms=False,
+    )
 
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout // 2)
-
-    try:
-        steps, _ = sim_anneal_route(
+    if workers > 1:
+        steps, annealing = sim_anneal_route_parallel(
+            gates, arch, phased_map, workers, timeout // 2, **route_kwargs
+        )
+    elif stream:
+        annealing = []
+        steps = streamed_route(
+            gates,
+            arch,
+            phased_map,
+            annealing,
+            deadline=time.time() + timeout // 2,
+            **route_kwargs,
+        )
+        return phased_map, steps, annealing
+    else:
+        steps, annealing = sim_anneal_route(
             gates,
             arch,
             phased_map,
-            reward_name="criticality",
-            order_fraction=1,
-            take_first_ms=False,
-            *[10, 0.1, 0.1],
+            deadline=time.time() + timeout // 2,
+            **route_kwargs,
         )
-    except TimeoutException:
-        print("Routing timed out. Writing partial output...")
-        with open(output_path, "w") as f:
-            json.dump({"map": phased_map, "steps": "timeout"}, f)
-        return
-    finally:
-        signal.alarm(0)
-    return phased_map, steps
-
-
-def run_sat_scmr(circ, gates, arch, output_path, timeout):
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout // 2)
-    depth = circ.depth(filter_function=lambda x: x[0].name in ["cx", "t", "tdg"])
+    report_routing(gates, arch, phased_map, len(steps), annealing)
+    return phased_map, steps, annealing
+
+
+def run_sat_scmr(
+    circ,
+    gates,
+    arch,
+    timeout,
+    search="incremental",
+    fix_map=False,
+    window=None,
+    solver="cd",
+):
+    """
+    Solve mapping and routing exactly. With search="binary" or fix_map a DASCOT run
+    (given half of the budget) comes first: its step count bounds the binary search,
+    and with fix_map its phased map is kept so that SAT only optimizes the routing.
+    circ is the QasmCircuit of the input, see parse_qasm.
+    With a window (in dependency layers) the circuit is solved by solve_windowed.
+    SAT gets the other half of the budget as a solver deadline and returns the best
+    schedule found by then. If it has none, the DASCOT schedule is used instead
+    (running DASCOT on the remaining half if it hasn't run yet). Returns the map,
+    the steps and, for a DASCOT schedule, its annealing effort (see dump). solver
+    is the pysat solver name, see solve.
+    """
+    upper_bound = None
+    fixed_map = None
+    dascot = None
+    if search == "binary" or fix_map:
+        dascot = run_dascot(circ, gates, arch, timeout // 2)
+        phased_map, dascot_steps, _ = dascot
+        upper_bound = len(dascot_steps)
+        if fix_map:
+            fixed_map = dict(phased_map)
+    deadline = time.time() + timeout // 2
+    depth = circ.depth
+    # no step count below the lower bound can be satisfied
+    start_from = max(depth, step_lower_bound(gates, arch, fixed_map))
     width = arch["width"]
     height = arch["height"]
     msf_faces = arch["magic_states"]
     alg_qubits = arch["alg_qubits"]
-    try:
+    if window:
+        map, steps = solve_windowed(
+            gates,
+            msf_faces,
+            alg_qubits,
+            width,
+            height,
+            window=window,
+            fixed_map=fixed_map,
+            deadline=deadline,
+            solver=solver,
+        )
+    else:
         map, steps = solve(
             gates=gates,
             msf_faces=msf_faces,
             grid_len=width,
             grid_height=height,
             alg_qubits=alg_qubits,
-            start_from=depth
+            start_from=start_from,
+            search=search,
+            upper_bound=upper_bound,
+            fixed_map=fixed_map,
+            deadline=deadline,
+            solver=solver,
         )
-    except TimeoutException:
-        print("Mapping and routing timed out. Writing partial output...")
-        with open(output_path, "w") as f:
-            json.dump({"steps": "timeout"}, f)
-        return
-    finally:
-        signal.alarm(0)
-    return map, steps
+    if isinstance(steps, list):
+        return map, steps, None
+    print(f"SAT mapping and routing gave no schedule ({steps}), using DASCOT")
+    if dascot is None:
+        dascot = run_dascot(circ, gates, arch, timeout // 2)
+    return dascot
@@ -0,0 +1,86 @@
+"""
+Columnar gate list shared by the mapper, the router and the SAT encoding: int32
+arrays per field instead of a list of tuples, with the per-gate dependency data every
+stage derives from it computed once.
+"""
+
+import numpy as np
+
+# op codes of the op column
+OPS = ["cx", "t", "tdg"]
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+
+
+class GateTable:
+    """
+    Gates as int32 columns: q0, q1 (-1 for T gates) and op (an index into OPS). For
+    every gate also its layer (0 based, ASAP over the gates unless given, e.g. the
+    DAG layer from parse_qasm), the previous gate on q0 and q1 (pred0, pred1, -1 if
+    none) and its criticality (longest dependency chain starting at it, as in
+    build_crit_dict_fast). Indexing and iterating give the usual (q0, q1) / (q0,)
+    tuples, so a GateTable can be passed wherever a gate list is expected.
+    """
+
+    def __init__(self, q0, q1, op, layer=None):
+        self.q0 = np.asarray(q0, dtype=np.int32)
+        self.q1 = np.asarray(q1, dtype=np.int32)
+        self.op = np.asarray(op, dtype=np.int32)
+        pred0, pred1, asap = [], [], []
+        last = {}
+        for a, b in zip(self.q0.tolist(), self.q1.tolist()):
+            p0 = last.get(a, -1)
+            p1 = last.get(b, -1) if b >= 0 else -1
+            pred0.append(p0)
+            pred1.append(p1)
+            asap.append(1 + max(asap[p] if p >= 0 else -1 for p in (p0, p1)))
+            last[a] = len(pred0) - 1
+            if b >= 0:
+                last[b] = len(pred0) - 1
+        crit = [1] * len(pred0)
+        for id in range(len(pred0) - 1, -1, -1):
+            for p in (pred0[id], pred1[id]):
+                if p >= 0 and crit[p] <= crit[id]:
+                    crit[p] = crit[id] + 1
+        self.pred0 = np.array(pred0, dtype=np.int32)
+        self.pred1 = np.array(pred1, dtype=np.int32)
+        self.crit = np.array(crit, dtype=np.int32)
+        self.layer = np.asarray(asap if layer is None else layer, dtype=np.int32)
+
+    @classmethod
+    def from_gates(cls, gates, ops=None):
+        """Table of a list of gate tuples; ops defaults to cx and t."""
+        if ops is None:
+            ops = ["cx" if len(gate) == 2 else "t" for gate in gates]
+        return cls(
+            [gate[0] for gate in gates],
+            [gate[1] if len(gate) == 2 else -1 for gate in gates],
+            [OP_CODES[op] for op in ops],
+        )
+
+    def __len__(self):
+        return len(self.q0)
+
+    def __getitem__(self, id):
+        if isinstance(id, slice):
+            return [self[i] for i in range(*id.indices(len(self)))]
+        b = int(self.q1[id])
+        return (int(self.q0[id]),) if b < 0 else (int(self.q0[id]), b)
+
+    def __iter__(self):
+        for a, b in zip(self.q0.tolist(), self.q1.tolist()):
+            yield (a,) if b < 0 else (a, b)
+
+    @property
+    def ops(self):
+        return [OPS[code] for code in self.op.tolist()]
+
+    @property
+    def num_layers(self):
+        return int(self.layer.max()) + 1 if len(self) else 0
+
+    def edges(self):
+        """(previous gate, gate) dependency pairs, as edge_list_from_gate_list."""
+        ids = np.repeat(np.arange(len(self), dtype=np.int32), 2)
+        preds = np.stack([self.pred0, self.pred1], axis=1).ravel()
+        mask = preds >= 0
+        return list(zip(preds[mask].tolist(), ids[mask].tolist()))
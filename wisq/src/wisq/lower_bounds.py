@@ -0,0 +1,124 @@
+"""
+Lower bounds on the number of steps of any mapped and routed schedule, used to
+skip step counts SAT can't satisfy and to measure how far DASCOT is from optimal.
+"""
+
+from .sarouting import build_crit_dict_fast
+
+
+def dependency_depths(gates):
+    """
+    For every gate, the longest dependency chain starting at it (tails) and ending
+    at it (heads), both counting the gate itself.
+    """
+    tails = build_crit_dict_fast(gates)
+    reversed_tails = build_crit_dict_fast(gates[::-1])
+    heads = {id: reversed_tails[len(gates) - 1 - id] for id in range(len(gates))}
+    return tails, heads
+
+
+def resource_bound(gate_ids, capacity, tails, heads):
+    """
+    Steps needed when at most `capacity` of the gates `gate_ids` can run per step:
+    the n gates with tail >= d take ceil(n / capacity) steps and the last of them
+    still has d - 1 steps of dependents after it (symmetrically for heads).
+    """
+    if not gate_ids or capacity <= 0:
+        return 0
+    bound = 0
+    for depth in (tails, heads):
+        depths = sorted((depth[id] for id in gate_ids), reverse=True)
+        for i, d in enumerate(depths):
+            bound = max(bound, -(-(i + 1) // capacity) + d - 1)
+    return bound
+
+
+def critical_path_bound(gates):
+    return max(build_crit_dict_fast(gates).values(), default=0)
+
+
+def magic_state_bound(gates, arch, capacity=None, depths=None):
+    """
+    Bound from magic state bandwidth: at most `capacity` T gates per step, by default
+    one per factory (each factory face can only be part of one braid per step).
+    """
+    if capacity is None:
+        capacity = len(arch["magic_states"])
+    tails, heads = depths or dependency_depths(gates)
+    t_gates = [id for id, gate in enumerate(gates) if len(gate) == 1]
+    return resource_bound(t_gates, capacity, tails, heads)
+
+
+def cut_capacities(arch, mapping, blocked):
+    """
+    Usable crossing edges of every straight cut of the grid, as two lists: between
+    columns x and x+1, and between rows y and y+1. An edge is unusable if it touches
+    a blocked face or joins two data qubits (braids can't pass through data qubits).
+    """
+    width, height = arch["width"], arch["height"]
+    occupied = set(mapping.values())
+
+    def usable(a, b):
+        if a in blocked or b in blocked:
+            return False
+        return not (a in occupied and b in occupied)
+
+    columns = [
+        sum(usable(y * width + x, y * width + x + 1) for y in range(height))
+        for x in range(width - 1)
+    ]
+    rows = [
+        sum(usable(y * width + x, (y + 1) * width + x) for x in range(width))
+        for y in range(height - 1)
+    ]
+    return columns, rows
+
+
+def congestion_bound(gates, arch, mapping, blocked=None, depths=None):
+    """
+    Edge-disjointness bound for a known placement: every CNOT whose qubits lie on
+    both sides of a straight cut needs its own crossing edge in the step it runs.
+    blocked are the faces no braid may use, by default the magic states.
+    """
+    if blocked is None:
+        blocked = arch["magic_states"]
+    width = arch["width"]
+    mapping = dict(mapping)
+    tails, heads = depths or dependency_depths(gates)
+    columns, rows = cut_capacities(arch, mapping, set(blocked))
+    cnots = [
+        (id, [(mapping[q] % width, mapping[q] // width) for q in gate])
+        for id, gate in enumerate(gates)
+        if len(gate) == 2
+    ]
+    bound = 0
+    for axis, capacities in ((0, columns), (1, rows)):
+        for cut, capacity in enumerate(capacities):
+            crossing = [
+                id
+                for id, ends in cnots
+                if min(e[axis] for e in ends) <= cut < max(e[axis] for e in ends)
+            ]
+            bound = max(bound, resource_bound(crossing, capacity, tails, heads))
+    return bound
+
+
+def step_lower_bound(
+    gates, arch, mapping=None, t_capacity=None, count_t=True, blocked=None
+):
+    """
+    Combined lower bound: critical path, magic state bandwidth (unless count_t is
+    False) and, if the placement is known, cut congestion.
+    """
+    depths = dependency_depths(gates)
+    bound = critical_path_bound(gates)
+    if count_t:
+        bound = max(bound, magic_state_bound(gates, arch, t_capacity, depths))
+    if mapping is not None:
+        bound = max(bound, congestion_bound(gates, arch, mapping, blocked, depths))
+    return bound
+
+
+def optimality_gap(num_steps, lower_bound):
+    """Relative distance of a schedule with num_steps steps from the lower bound."""
+    return (num_steps - lower_bound) / max(lower_bound, 1)
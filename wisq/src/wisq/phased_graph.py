@@ -1,10 +1,14 @@
 import itertools
+import math
+import multiprocessing
 import random
 import time
 from qiskit.converters import circuit_to_dag, dag_to_circuit
 from qiskit.dagcircuit.dagnode import DAGNode, DAGOpNode, DAGInNode, DAGOutNode
 from qiskit import QuantumCircuit
 import numpy as np
+from .architecture import as_architecture
+from .qasm_parser import QasmCircuit
 
 
 ## Random
@@ -62,6 +66,23 @@ def build_phased_connectivity_graph_fast(circuit, include_t=True):
                 graph[q._index].add((q._index,dag.num_qubits()))
     return phased_graphs
 
+def build_phased_connectivity_graph_from_qasm(circuit, include_t=True):
+    """build_phased_connectivity_graph_fast from the layers recorded by parse_qasm"""
+    num_qubits = circuit.num_qubits
+    phased_graphs = {i : {q : set() for q in range(num_qubits+1)} for i in range(circuit.num_layers)}
+    table = circuit.gates
+    for layer, c, t in zip(table.layer.tolist(), table.q0.tolist(), table.q1.tolist()):
+        graph = phased_graphs[layer]
+        if t >= 0:
+            graph[c].add((c, t))
+            graph[t].add((c, t))
+        elif include_t:
+            graph[c].add((c, num_qubits))
+    for layer, _, (c, t) in circuit.layered:
+        phased_graphs[layer][c].add((c, t))
+        phased_graphs[layer][t].add((c, t))
+    return phased_graphs
+
 def overlapping(xmin1, xmax1, ymin1, ymax1, xmin2, xmax2, ymin2, ymax2):
     if xmax1 < xmin2 or xmax2 < xmin1:
         return False
@@ -221,35 +242,144 @@ def update_overlaps_fast(phased_graphs, arch, old_mapping, new_mapping, qubit1,
                     overlap_delta += 1
     return overlap_delta
 
+class OverlapCost:
+    """Array-backed overlap cost of a mapping over the phased connectivity graphs.
+
+    Every edge of every layer is a row of flat arrays holding its layer, its
+    endpoints and its bounding box under the current mapping. Rows are sorted
+    by layer, so the edges a swap has to be compared against are contiguous
+    slices, and a swap only recomputes the rows of the two swapped qubits.
+    """
+
+    def __init__(self, phased_graphs, arch, mapping):
+        arch = as_architecture(arch)
+        self.grid_len = arch.width
+        # (x, y) of the factory nearest to every tile
+        nearest = arch.nearest_msf
+        if nearest.shape[1]:
+            self.nearest_msf = np.stack([arch.x[nearest[:, 0]], arch.y[nearest[:, 0]]], axis=1)
+        else:
+            self.nearest_msf = None
+        layer_of, controls, targets = [], [], []
+        layer_start, layer_size = [], []
+        num_nodes = 1 + max((q for q in mapping.keys()), default=0)
+        for i, g in enumerate(phased_graphs.values()):
+            num_nodes = max(num_nodes, len(g))
+            edges = sorted({x for q in g.keys() for x in g[q]})
+            layer_start.append(len(controls))
+            layer_size.append(len(edges))
+            for c, t in edges:
+                layer_of.append(i)
+                controls.append(c)
+                targets.append(t if t in mapping.keys() else -1)
+        self.edge_layer = np.array(layer_of, dtype=np.int64)
+        self.edge_c = np.array(controls, dtype=np.int64)
+        self.edge_t = np.array(targets, dtype=np.int64)
+        self.layer_start = np.array(layer_start, dtype=np.int64)
+        self.layer_size = np.array(layer_size, dtype=np.int64)
+        qubit_rows = [[] for _ in range(num_nodes)]
+        for row, (c, t) in enumerate(zip(controls, targets)):
+            qubit_rows[c].append(row)
+            if t >= 0:
+                qubit_rows[t].append(row)
+        self.qubit_rows = [np.array(rows, dtype=np.int64) for rows in qubit_rows]
+        self.pos = np.zeros((num_nodes, 2), dtype=np.int32)
+        for q, p in mapping.items():
+            self.pos[q] = p
+        self.boxes = self.row_boxes(np.arange(len(controls)), self.pos)
+        self.overlaps = self.count()
+
+    def row_boxes(self, rows, pos):
+        """(xmin, xmax, ymin, ymax) of the given edge rows under positions pos."""
+        p_c = pos[self.edge_c[rows]]
+        t = self.edge_t[rows]
+        p_t = pos[np.maximum(t, 0)]
+        is_t_gate = t < 0
+        if is_t_gate.any():
+            p = p_c[is_t_gate]
+            p_t[is_t_gate] = self.nearest_msf[p[:, 1] * self.grid_len + p[:, 0]]
+        boxes = np.empty((len(rows), 4), dtype=np.int32)
+        np.minimum(p_c[:, 0], p_t[:, 0], out=boxes[:, 0])
+        np.maximum(p_c[:, 0], p_t[:, 0], out=boxes[:, 1])
+        np.minimum(p_c[:, 1], p_t[:, 1], out=boxes[:, 2])
+        np.maximum(p_c[:, 1], p_t[:, 1], out=boxes[:, 3])
+        return boxes
+
+    def count(self):
+        overlaps = 0
+        for start, size in zip(self.layer_start, self.layer_size):
+            b = self.boxes[start:start + size]
+            overlap = boxes_overlapping(b[:, None, :], b[None, :, :])
+            overlaps += (int(overlap.sum()) - size) // 2
+        return int(overlaps)
+
+    def swap_delta(self, qubit1, qubit2):
+        """Change in overlaps if qubit1 and qubit2 swapped places, and the move to apply it."""
+        rows = np.union1d(self.qubit_rows[qubit1], self.qubit_rows[qubit2])
+        pos = self.pos.copy()
+        pos[[qubit1, qubit2]] = pos[[qubit2, qubit1]]
+        new_boxes = self.row_boxes(rows, pos)
+        move = (qubit1, qubit2, rows, new_boxes)
+        if len(rows) == 0:
+            return 0, move
+        counts = self.layer_size[self.edge_layer[rows]]
+        starts = self.layer_start[self.edge_layer[rows]]
+        owner = np.repeat(np.arange(len(rows)), counts)
+        offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        others = np.repeat(starts, counts) + offsets
+        modified = rows[owner]
+        other_modified = np.isin(others, rows)
+        # skip self pairs and count pairs of two modified edges only once
+        keep = (others != modified) & ~(other_modified & (others < modified))
+        old_other = self.boxes[others]
+        new_other = old_other.copy()
+        new_other[other_modified] = new_boxes[np.searchsorted(rows, others[other_modified])]
+        old = boxes_overlapping(self.boxes[modified], old_other)
+        new = boxes_overlapping(new_boxes[owner], new_other)
+        return int(new[keep].sum()) - int(old[keep].sum()), move
+
+    def apply(self, move):
+        qubit1, qubit2, rows, new_boxes = move
+        self.pos[[qubit1, qubit2]] = self.pos[[qubit2, qubit1]]
+        self.boxes[rows] = new_boxes
+
+
+def boxes_overlapping(b1, b2):
+    return ~(
+        (b1[..., 1] < b2[..., 0])
+        | (b2[..., 1] < b1[..., 0])
+        | (b1[..., 3] < b2[..., 2])
+        | (b2[..., 3] < b1[..., 2])
+    )
+
+
 def sim_anneal(mapping, phased_graphs_fast, arch, retain_history, temperature=100, cooling_rate=0.1, termination_temp=0.1, timeout=3600):
     current_mapping = mapping.copy()
     best_mapping = mapping.copy()
-    #best_overlaps = count_overlapping(mapping, phased_graphs,arch)
-    best_overlaps = count_overlapping_fast(mapping, phased_graphs_fast,arch)
+    cost = OverlapCost(phased_graphs_fast, arch, mapping)
+    best_overlaps = cost.overlaps
     current_overlaps = best_overlaps
-    #assert(best_overlaps == best_overlaps_fast)
+    qubits = np.fromiter(mapping.keys(), dtype=int)
     visited = []
     start = time.time()
     current = start
     steps = 0
     while temperature > termination_temp and best_overlaps > 0 and current-start < timeout:
         steps += 1
-        new_mapping = current_mapping.copy()
-        qubit1, qubit2 = np.random.choice(np.fromiter(mapping.keys(), dtype=int), size=2, replace=False)
-        new_mapping[qubit1], new_mapping[qubit2] = new_mapping[qubit2], new_mapping[qubit1]
-        #delta = update_overlaps(phased_graphs, arch, best_mapping, new_mapping, qubit1, qubit2)
-        delta_curr = update_overlaps_fast(phased_graphs_fast, arch, current_mapping, new_mapping, qubit1, qubit2)
-        delta_best = update_overlaps_fast(phased_graphs_fast, arch, best_mapping, new_mapping, qubit1, qubit2)
-        #assert delta == delta_fast, f"{delta}, {delta_fast}"
+        qubit1, qubit2 = np.random.choice(qubits, size=2, replace=False)
+        delta_curr, move = cost.swap_delta(qubit1, qubit2)
         new_overlaps = current_overlaps + delta_curr
         if retain_history:
+            new_mapping = current_mapping.copy()
+            new_mapping[qubit1], new_mapping[qubit2] = new_mapping[qubit2], new_mapping[qubit1]
             visited.append((new_mapping, new_overlaps))
         if delta_curr < 0 or np.random.rand() < np.exp(-delta_curr / temperature):
-            current_mapping = new_mapping
+            cost.apply(move)
+            current_mapping[qubit1], current_mapping[qubit2] = current_mapping[qubit2], current_mapping[qubit1]
             current_overlaps = new_overlaps
-        if delta_best < 0 or np.random.rand():
-            best_mapping = new_mapping
-            best_overlaps = new_overlaps
+            if current_overlaps < best_overlaps:
+                best_mapping = current_mapping.copy()
+                best_overlaps = current_overlaps
         temperature *= 1 - cooling_rate
         current = time.time()
     #print(f"mapping sa steps {steps}")
@@ -259,19 +389,156 @@ def sim_anneal(mapping, phased_graphs_fast, arch, retain_history, temperature=10
         return best_mapping, best_overlaps
 
 
-def build_phased_map(log_qubits, circ, arch, initial_temp, cooling_rate, term_temp,  timeout, include_t=True, retain_history=False):
-    grid_len = arch['width']
-    faces = arch['alg_qubits']
+def tempering_replica(conn, phased_graphs_fast, arch, mapping, seed):
+    """One replica of parallel tempering, driven over conn by parallel_tempering.
+
+    Each request (temperature, moves, deadline) runs that many Metropolis moves
+    at a fixed temperature and answers (current overlaps, best overlaps); None
+    answers the best mapping seen and stops the replica.
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    cost = OverlapCost(phased_graphs_fast, arch, mapping)
+    current_mapping = mapping.copy()
+    best_mapping = mapping.copy()
+    current_overlaps = best_overlaps = cost.overlaps
+    qubits = np.fromiter(mapping.keys(), dtype=int)
+    conn.send((current_overlaps, best_overlaps))
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        temperature, moves, deadline = request
+        for _ in range(moves):
+            if best_overlaps == 0 or len(qubits) < 2 or time.time() > deadline:
+                break
+            qubit1, qubit2 = np.random.choice(qubits, size=2, replace=False)
+            delta, move = cost.swap_delta(qubit1, qubit2)
+            if delta < 0 or np.random.rand() < np.exp(-delta / temperature):
+                cost.apply(move)
+                current_mapping[qubit1], current_mapping[qubit2] = current_mapping[qubit2], current_mapping[qubit1]
+                current_overlaps += delta
+                if current_overlaps < best_overlaps:
+                    best_mapping = current_mapping.copy()
+                    best_overlaps = current_overlaps
+        conn.send((current_overlaps, best_overlaps))
+    conn.send((best_mapping, best_overlaps))
+    conn.close()
+
+
+# seconds a replica gets to answer the final request once the deadline has passed
+REPLY_GRACE = 5
+
+
+def send(conn, message):
+    """Send message to a replica, False if it is gone."""
+    try:
+        conn.send(message)
+        return True
+    except OSError:
+        return False
+
+
+def receive(conn, deadline):
+    """Next answer of a replica, or None if it died or did not answer by deadline."""
+    if not conn.poll(max(deadline - time.time(), 0)):
+        return None
+    try:
+        return conn.recv()
+    except EOFError:
+        return None
+
+
+def parallel_tempering(initial_mappings, phased_graphs_fast, arch, temperatures, moves, exchange_interval, timeout):
+    """
+    Anneal one replica per initial mapping in its own process, replica i starting
+    at temperatures[i]. Every exchange_interval moves, replicas at neighbouring
+    temperatures swap temperatures with the usual Metropolis criterion. Stops after
+    `moves` moves per replica, after `timeout` seconds or when a replica reaches zero
+    overlaps, and returns the lowest-overlap mapping seen by any replica. Replicas
+    that die or miss the deadline are left out; if none is left, the first initial
+    mapping is returned.
+    """
+    deadline = time.time() + timeout
+    conns, replicas = [], []
+    try:
+        for mapping in initial_mappings:
+            parent_conn, child_conn = multiprocessing.Pipe()
+            p = multiprocessing.Process(
+                target=tempering_replica,
+                args=(child_conn, phased_graphs_fast, arch, mapping, random.randrange(2**32)),
+            )
+            p.start()
+            # only the replica holds the child end, so its death shows up as EOF
+            child_conn.close()
+            conns.append(parent_conn)
+            replicas.append(p)
+        state = [receive(conn, deadline) for conn in conns]
+        # ladder[k] is the replica currently at temperatures[k]
+        ladder = list(range(len(replicas)))
+        sweep = 0
+        while moves > 0 and None not in state and time.time() < deadline and min(best for _, best in state) > 0:
+            for k, r in enumerate(ladder):
+                send(conns[r], (temperatures[k], min(exchange_interval, moves), deadline))
+            state = [receive(conn, deadline) for conn in conns]
+            if None in state:
+                break
+            moves -= exchange_interval
+            for k in range(sweep % 2, len(ladder) - 1, 2):
+                i, j = ladder[k], ladder[k + 1]
+                exponent = (1 / temperatures[k] - 1 / temperatures[k + 1]) * (state[i][0] - state[j][0])
+                if exponent >= 0 or random.random() < math.exp(exponent):
+                    ladder[k], ladder[k + 1] = j, i
+            sweep += 1
+        # only replicas that answered the last request are waiting for the next one
+        waiting = [conn for conn, answer in zip(conns, state) if answer is not None and send(conn, None)]
+        reply_deadline = max(deadline, time.time()) + REPLY_GRACE
+        results = [r for r in (receive(conn, reply_deadline) for conn in waiting) if r is not None]
+    finally:
+        # replicas have sent everything they will be asked for, stop any left running
+        for p in replicas:
+            p.terminate()
+            p.join()
+        for conn in conns:
+            conn.close()
+    if not results:
+        print("All tempering replicas failed, keeping the initial mapping")
+        mapping = initial_mappings[0]
+        return mapping, OverlapCost(phased_graphs_fast, arch, mapping).overlaps
+    return min(results, key=lambda r: r[1])
+
+
+def build_phased_map(log_qubits, circ, arch, initial_temp, cooling_rate, term_temp,  timeout, include_t=True, retain_history=False, workers=1, exchange_interval=100):
+    arch = as_architecture(arch)
+    grid_len = arch.width
+    faces = arch.alg_qubits
     map_tuples = build_random_map(log_qubits, arch)
     map_flat = {t[0] :  t[1] for t in map_tuples}
-    map_2d = {k : tuple(reversed(divmod(v, grid_len))) for k, v in map_flat.items()}
+    map_2d = {k : arch.coords(v) for k, v in map_flat.items()}
     initial_mapping = map_2d
     #initial_mapping = {i : tuple(reversed(divmod(faces[i], grid_len))) for i in range(log_num)}
 
-    p_g_fast = build_phased_connectivity_graph_fast(circ, include_t=include_t)
+    if isinstance(circ, QasmCircuit):
+        p_g_fast = build_phased_connectivity_graph_from_qasm(circ, include_t=include_t)
+    else:
+        p_g_fast = build_phased_connectivity_graph_fast(circ, include_t=include_t)
     if retain_history:
         mappings = sim_anneal(initial_mapping, p_g_fast, arch, timeout=timeout, temperature=1, cooling_rate=0.001, retain_history=True)
         return [([(key, val[1]*grid_len + val[0]) for key, val in mapping.items()], overlaps) for mapping, overlaps  in mappings]
+    elif workers > 1:
+        # multi-start: every replica begins from its own random map, on a geometric
+        # temperature ladder spanning the annealing schedule
+        initial_mappings = [initial_mapping] + [
+            {k : arch.coords(v) for k, v in build_random_map(log_qubits, arch)}
+            for _ in range(workers - 1)
+        ]
+        temperatures = [initial_temp * (term_temp / initial_temp) ** (i / (workers - 1)) for i in range(workers)]
+        moves = 0
+        if 0 < cooling_rate < 1 and initial_temp > term_temp:
+            moves = math.ceil(math.log(term_temp / initial_temp) / math.log(1 - cooling_rate))
+        final_mapping, cost = parallel_tempering(initial_mappings, p_g_fast, arch, temperatures, moves, exchange_interval, timeout)
+        tuples = [(key, val[1]*grid_len + val[0]) for key, val in final_mapping.items()]
+        return tuples, cost
     else:
         final_mapping, cost = sim_anneal(initial_mapping, p_g_fast, arch,timeout=timeout, temperature=initial_temp, cooling_rate=cooling_rate, termination_temp=term_temp, retain_history=False)
         tuples = [(key, val[1]*grid_len + val[0]) for key, val in final_mapping.items()]
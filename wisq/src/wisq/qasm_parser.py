@@ -0,0 +1,195 @@
+"""
+Single pass OpenQASM 2 reader for mapping and routing. It streams the file once and
+keeps only what map_and_route needs (the cx/t gate list, op labels, qubit count,
+cx/t depth and the dependency layers of the phased graph) instead of building a
+Qiskit circuit and DAG.
+"""
+
+import re
+from array import array
+from .gate_table import OP_CODES, GateTable
+
+STATEMENT = re.compile(r"\s*(\w+)\s*(?:\((.*)\))?\s*(.*)", re.S)
+ARGUMENT = re.compile(r"\s*(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*$")
+# the common case, one gate on indexed qubits per line
+SIMPLE = re.compile(
+    r"\s*(\w+)\s*(?:\([^;]*\))?\s+(\w+)\s*\[\s*(\d+)\s*\]"
+    r"\s*(?:,\s*(\w+)\s*\[\s*(\d+)\s*\]\s*)?;\s*$"
+)
+CONDITION = re.compile(r"\s*if\s*\(\s*(\w+)\s*==\s*\d+\s*\)(.*)", re.S)
+IGNORED = ("OPENQASM", "include", "opaque")
+# operations counted by the cx/t depth, as in circ.depth(filter_function=...)
+DEPTH_OPS = ("cx", "t", "tdg")
+T_OPS = ("t", "tdg")
+
+
+class QasmCircuit:
+    """
+    gates, the cx and T gates as a GateTable whose layers are those of the circuit DAG
+    (qubits over all registers, in declaration order), ops their labels as returned
+    by extract_gates_from_file, num_qubits declared, depth the cx/t depth, num_layers
+    the depth of the circuit DAG and layered the (layer, op, qubits) of every other
+    two qubit operation, see build_phased_connectivity_graph_from_qasm.
+    """
+
+    def __init__(self):
+        # columns of gates, filled while parsing
+        self.q0 = array("i")
+        self.q1 = array("i")
+        self.op = array("i")
+        self.layer = array("i")
+        self.gates = None
+        self.qregs = {}
+        self.cregs = {}
+        self.num_qubits = 0
+        self.num_clbits = 0
+        self.depth = 0
+        self.num_layers = 0
+        self.layered = []
+        # per qubit and clbit: cx/t depth and DAG layer of the last operation on it
+        self.qubit_depth = []
+        self.qubit_layer = []
+        self.clbit_depth = []
+        self.clbit_layer = []
+
+    def declare(self, kind, arg):
+        match = ARGUMENT.match(arg)
+        if match is None or match.group(2) is None:
+            raise ValueError(f"Invalid register declaration: {kind} {arg}")
+        size = int(match.group(2))
+        if kind == "qreg":
+            self.qregs[match.group(1)] = (self.num_qubits, size)
+            self.num_qubits += size
+            self.qubit_depth += [0] * size
+            self.qubit_layer += [0] * size
+        else:
+            self.cregs[match.group(1)] = (self.num_clbits, size)
+            self.num_clbits += size
+            self.clbit_depth += [0] * size
+            self.clbit_layer += [0] * size
+
+    def bits(self, arg, registers):
+        match = ARGUMENT.match(arg)
+        if match is None or match.group(1) not in registers:
+            raise ValueError(f"Unknown register in argument: {arg}")
+        offset, size = registers[match.group(1)]
+        if match.group(2) is None:
+            return list(range(offset, offset + size))
+        return [offset + int(match.group(2))]
+
+    def apply(self, op, qubits, clbits=()):
+        depth = layer = 0
+        for q in qubits:
+            depth = max(depth, self.qubit_depth[q])
+            layer = max(layer, self.qubit_layer[q])
+        for c in clbits:
+            depth = max(depth, self.clbit_depth[c])
+            layer = max(layer, self.clbit_layer[c])
+        layer += 1
+        if op in DEPTH_OPS:
+            depth += 1
+            if depth > self.depth:
+                self.depth = depth
+        if layer > self.num_layers:
+            self.num_layers = layer
+        for q in qubits:
+            self.qubit_depth[q] = depth
+            self.qubit_layer[q] = layer
+        for c in clbits:
+            self.clbit_depth[c] = depth
+            self.clbit_layer[c] = layer
+        if op == "cx" and len(qubits) == 2 or op in T_OPS:
+            self.q0.append(qubits[0])
+            self.q1.append(qubits[1] if op == "cx" else -1)
+            self.op.append(OP_CODES[op])
+            self.layer.append(layer - 1)
+        elif len(qubits) == 2:
+            self.layered.append((layer - 1, op, tuple(qubits)))
+
+    @property
+    def ops(self):
+        return self.gates.ops
+
+    def execute_simple(self, match):
+        """Apply a statement matched by SIMPLE, or return False if it is something else."""
+        op, reg, index, reg2, index2 = match.groups()
+        if op in IGNORED or op in ("qreg", "creg", "measure", "barrier"):
+            return False
+        if reg not in self.qregs or (reg2 is not None and reg2 not in self.qregs):
+            return False
+        qubits = [self.qregs[reg][0] + int(index)]
+        if reg2 is not None:
+            qubits.append(self.qregs[reg2][0] + int(index2))
+        self.apply({"CX": "cx", "U": "u"}.get(op, op), qubits)
+        return True
+
+    def execute(self, statement):
+        clbits = []
+        condition = CONDITION.match(statement)
+        if condition:
+            clbits = self.bits(condition.group(1), self.cregs)
+            statement = condition.group(2)
+        match = STATEMENT.match(statement)
+        if match is None:
+            return
+        op, _, args = match.groups()
+        if op in IGNORED:
+            return
+        if op in ("qreg", "creg"):
+            self.declare(op, args)
+            return
+        # the builtin gates, as Qiskit names them
+        op = {"CX": "cx", "U": "u"}.get(op, op)
+        if op == "measure":
+            qarg, carg = args.split("->")
+            for q, c in zip(self.bits(qarg, self.qregs), self.bits(carg, self.cregs)):
+                self.apply(op, [q], clbits + [c])
+            return
+        operands = [self.bits(arg, self.qregs) for arg in args.split(",")]
+        if op == "barrier":
+            self.apply(op, [q for bits in operands for q in bits], clbits)
+            return
+        # gates on whole registers are applied to every index of them
+        width = max(len(bits) for bits in operands)
+        for i in range(width):
+            qubits = [bits[0] if len(bits) == 1 else bits[i] for bits in operands]
+            self.apply(op, qubits, clbits)
+
+
+def parse_qasm(path):
+    """
+    Read the OpenQASM 2 file at path in one pass into a QasmCircuit. Gate definitions
+    are skipped, so custom gates count as single operations, as in a Qiskit DAG.
+    """
+    circuit = QasmCircuit()
+    pending = ""
+    in_definition = False
+    with open(path) as f:
+        for line in f:
+            if not pending and not in_definition:
+                match = SIMPLE.match(line)
+                if match and circuit.execute_simple(match):
+                    continue
+            pending += line.split("//", 1)[0]
+            while pending:
+                if in_definition:
+                    end = pending.find("}")
+                    if end < 0:
+                        pending = ""
+                        break
+                    pending = pending[end + 1 :]
+                    in_definition = False
+                    continue
+                end = pending.find(";")
+                start = pending.find("{")
+                if 0 <= start and (end < 0 or start < end):
+                    pending = pending[start + 1 :]
+                    in_definition = True
+                    continue
+                if end < 0:
+                    break
+                circuit.execute(pending[:end])
+                pending = pending[end + 1 :].lstrip()
+    circuit.gates = GateTable(circuit.q0, circuit.q1, circuit.op, circuit.layer)
+    circuit.q0 = circuit.q1 = circuit.op = circuit.layer = None
+    return circuit
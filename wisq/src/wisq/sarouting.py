@@ -1,8 +1,14 @@
 import itertools
-import math
 import random
+import time
 import numpy as np
-from .architecture import vertical_neighbors, horizontal_neighbors
+from .architecture import (
+    Architecture,
+    as_architecture,
+    vertical_neighbors,
+    horizontal_neighbors,
+)
+from .gate_table import GateTable
 import rustworkx as rx
 import os
 
@@ -32,140 +38,196 @@ else:
     raise ValueError("invalid HBM_CONFIG option")    
 print(HBM_ARCH)   
 
-def route_gate(
-    indexed_gate, grid_len, grid_height, msf_faces, mapping, to_remove, to_remove_hbm, take_first_ms
-):
-    device_graph = rx.generators.grid_graph(rows=grid_height, cols=grid_len)
-    for idx in device_graph.node_indices():
-        device_graph[idx] = idx  # payload = original index
-    # print("init nodes:",device_graph.node_indices())
-
-    # remove nodes by converting payload -> internal index
-    device_graph.remove_nodes_from([
-        device_graph.find_node_by_weight(v) for v in to_remove if device_graph.find_node_by_weight(v) is not None
-    ])
-    # print("first to remove:", to_remove)
-    # print("nodes after 1st removal:",device_graph.node_indices())
-    hbm_graph = rx.generators.grid_graph(rows=grid_height, cols=grid_len)
-    for idx in hbm_graph.node_indices():
-        hbm_graph[idx] = idx
-    hbm_graph.remove_nodes_from([
-        hbm_graph.find_node_by_weight(v) for v in to_remove_hbm if hbm_graph.find_node_by_weight(v) is not None
-    ])
-
-    shortest_path_len = 2**31 - 1
-    shortest_pair = None
+class RoutingState:
+    """Occupancy of the routing planes of an architecture.
+
+    The grid is built once per architecture and tiles keep their index as node
+    id, so reserving or releasing a tile only flips one entry of the occupancy
+    mask instead of rebuilding and relabelling a graph for every gate.
+    """
+
+    def __init__(
+        self,
+        grid_len,
+        grid_height,
+        blocked=(),
+        blocked_hbm=(),
+        magic_states=(),
+        arch=None,
+    ):
+        self.grid_len = grid_len
+        self.grid_height = grid_height
+        if arch is None:
+            arch = Architecture(grid_len, grid_height, magic_states=magic_states)
+        self.arch = arch
+        # factories of every tile, nearest first
+        self.nearest_msf = arch.nearest_msf.tolist()
+        self.adjacency = arch.neighbors
+        self.base = bytearray(grid_len * grid_height)
+        self.base_hbm = bytearray(grid_len * grid_height)
+        for v in blocked:
+            self.base[v] = 1
+        for v in blocked_hbm:
+            self.base_hbm[v] = 1
+        self.occupied = bytearray(self.base)
+        self.occupied_hbm = bytearray(self.base_hbm)
+
+    def reset(self):
+        """Release every tile that is not blocked by the architecture or mapping."""
+        self.occupied[:] = self.base
+        self.occupied_hbm[:] = self.base_hbm
+
+    def snapshot(self):
+        return bytes(self.occupied), bytes(self.occupied_hbm)
+
+    def restore(self, snapshot):
+        self.occupied[:], self.occupied_hbm[:] = snapshot
+
+    def is_free(self, tile, hbm=False):
+        return not (self.occupied_hbm if hbm else self.occupied)[tile]
+
+    def reserve(self, tile, hbm=False):
+        (self.occupied_hbm if hbm else self.occupied)[tile] = 1
+
+    def release(self, tile, hbm=False):
+        (self.occupied_hbm if hbm else self.occupied)[tile] = 0
+
+    def shortest_path(self, source, target, hbm=False):
+        """Shortest path from source to target over free tiles, or None."""
+        return self.nearest_path([source], [target], hbm=hbm)
+
+    def nearest_path(self, sources, targets, hbm=False, first_reachable=False):
+        """Shortest path over free tiles from any of sources to the best target.
+
+        Targets are ranked by their position in targets. A single breadth-first
+        sweep is seeded with every free source: by default it stops at the first
+        level that reaches a target and picks the best ranked one of that level,
+        with first_reachable it picks the best ranked target reachable at all.
+        Returns None if no target can be reached.
+        """
+        occupied = self.occupied_hbm if hbm else self.occupied
+        rank = {}
+        for i, t in enumerate(targets):
+            if not occupied[t] and t not in rank:
+                rank[t] = i
+        if not rank:
+            return None
+        top_rank = min(rank.values())
+        adjacency = self.adjacency
+        parent = {}
+        frontier = []
+        for s in sources:
+            if not occupied[s] and s not in parent:
+                parent[s] = None
+                frontier.append(s)
+        best = None
+        while frontier:
+            hits = [v for v in frontier if v in rank]
+            if hits:
+                hit = min(hits, key=rank.__getitem__)
+                if best is None or rank[hit] < rank[best]:
+                    best = hit
+                if not first_reachable or rank[best] == top_rank:
+                    break
+            next_frontier = []
+            for u in frontier:
+                for v in adjacency[u]:
+                    if v in parent or occupied[v]:
+                        continue
+                    parent[v] = u
+                    next_frontier.append(v)
+            frontier = next_frontier
+        if best is None:
+            return None
+        path = []
+        while best is not None:
+            path.append(best)
+            best = parent[best]
+        path.reverse()
+        return path
+
+
+def build_routing_state(arch, mapping):
+    arch = as_architecture(arch)
+    to_remove, to_remove_hbm = initialize_to_remove(arch.magic_states, mapping)
+    return RoutingState(
+        arch.width, arch.height, to_remove, to_remove_hbm, arch.magic_states, arch
+    )
+
+
+def route_gate(indexed_gate, state, mapping, take_first_ms):
+    arch = state.arch
 
     id, gate = indexed_gate
+    sources = arch.vertical[mapping[gate[0]]]
     if len(gate) == 2:
-        pairs = [
-            (vn, hn)
-            for vn in vertical_neighbors(
-                mapping[gate[0]], grid_len, grid_height, omitted_edges=[]
-            )
-            for hn in horizontal_neighbors(
-                mapping[gate[1]], grid_len, grid_height, omitted_edges=[]
-            )
-        ]
+        targets = arch.horizontal[mapping[gate[1]]]
     else:
         if HBM_ARCH == "ARCH_A":
             # don't even route T gates
-            return ([(id, gate, [])], to_remove, to_remove_hbm)
+            return [(id, gate, [])]
         else:
-            sorted_msf = sorted(
-                msf_faces,
-                key=lambda m: abs(
-                    list(reversed(divmod(m, grid_len)))[0]
-                    - list(reversed(divmod(mapping[gate[0]], grid_len)))[0]
-                )
-                + abs(
-                    list(reversed(divmod(m, grid_len)))[1]
-                    - list(reversed(divmod(mapping[gate[0]], grid_len)))[1]
-                ),
-            )
-            pairs = [
-                (vn, hn)
-                for magic_state in sorted_msf
-                for vn in vertical_neighbors(
-                    mapping[gate[0]], grid_len, grid_height, omitted_edges=[]
-                )
-                for hn in horizontal_neighbors(
-                    magic_state, grid_len, grid_height, omitted_edges=[]
-                )
+            targets = [
+                hn
+                for magic_state in state.nearest_msf[mapping[gate[0]]]
+                for hn in arch.horizontal[magic_state]
             ]
 
-    # filter pairs by checking payload existence
-    if HBM_ARCH == "ARCH_C" and len(gate) == 1: # for T gates in ARCH_C:
-        pairs = [
-            (s, t) for s, t in pairs
-            if device_graph.find_node_by_weight(s) is not None
-            and hbm_graph.find_node_by_weight(t) is not None
-        ]
-    else:
-        pairs = [
-            (s, t) for s, t in pairs
-            if device_graph.find_node_by_weight(s) is not None
-            and device_graph.find_node_by_weight(t) is not None
-        ]
-
-    # print("Filtered:", pairs)
-
-    graph_to_use = hbm_graph if (HBM_ARCH == "ARCH_C" and len(gate) == 1) else device_graph
-    for s_payload, t_payload in pairs:
-        # convert payload -> internal index
-        s = graph_to_use.find_node_by_weight(s_payload)
-        t = graph_to_use.find_node_by_weight(t_payload)
-        if s is None or t is None:
-            continue
-
-        const_1 = lambda _: 1
-        dist_dict = rx.dijkstra_shortest_path_lengths(
-            graph_to_use, edge_cost_fn=const_1, node=s, goal=t
-        )
-        dist = dist_dict[t] if t in dist_dict else math.inf
-
-        if dist < shortest_path_len:
-            shortest_path_len = dist
-            shortest_pair = s, t
-            if take_first_ms and len(gate) == 1:
-                break
-
-    if shortest_pair is not None:
-        s, t = shortest_pair
-        # print(s,t)
-        # print(graph_to_use.nodes())
-        # print(graph_to_use.node_indices())
-        
-        # convert internal indices -> payloads
-        if s==t:
-            path = []
-        else:
-            path_internal = list(rx.dijkstra_shortest_paths(graph_to_use, source=s, target=t)[t])
-            path = [graph_to_use.get_node_data(i) for i in path_internal]
-        if s not in path:
-            path = [graph_to_use.get_node_data(s)] + path
-        if t not in path:
-            path.append(graph_to_use.get_node_data(t))
-        route = [(id, gate, path)]
-        for v in path:
-            to_remove.add(v)
-    else:
-        route = []
-    return route, to_remove, to_remove_hbm
+    # for T gates in ARCH_C the target is on the upper plane and the search runs there
+    use_hbm = HBM_ARCH == "ARCH_C" and len(gate) == 1
+    sources = [s for s in sources if state.is_free(s)]
+    path = state.nearest_path(
+        sources,
+        targets,
+        hbm=use_hbm,
+        first_reachable=take_first_ms and len(gate) == 1,
+    )
+    if path is None:
+        return []
+    for v in path:
+        state.reserve(v)
+    return [(id, gate, path)]
+
+
+def try_order(order, items, state, mapping, take_first_ms):
+    step = []
+    state.reset()
+    for i in order:
+        step.extend(route_gate(items[i], state, mapping, take_first_ms))
+    return step
 
 
-def try_order(
-    order, executable, grid_len, grid_height, msf_faces, mapping, take_first_ms
+def try_order_incremental(
+    order, items, state, mapping, take_first_ms, trace=None
 ):
-    step = []
-    to_remove, to_remove_hbm = initialize_to_remove(msf_faces, mapping)
-    for i in range(len(executable)):
-        gate = list(executable.items())[order[i]]
-        route, to_remove, to_remove_hbm = route_gate(
-            gate, grid_len, grid_height, msf_faces, mapping, to_remove, to_remove_hbm, take_first_ms
-        )
-        step.extend(route)
-    return step
+    """Like try_order, but reuses the routed prefix shared with a previous order.
+
+    trace is the (order, routes, checkpoints) triple returned for a previously
+    routed order, where checkpoints[i] is the occupancy before position i was
+    routed. Only the gates from the first position where the two orders differ
+    are routed again. Returns the step and the trace of the new order.
+    """
+    start = 0
+    if trace is not None:
+        prev_order, prev_routes, prev_checkpoints = trace
+        if list(order) == list(prev_order):
+            return [r for route in prev_routes for r in route], trace
+        while start < min(len(order), len(prev_order)) and order[start] == prev_order[start]:
+            start += 1
+    if 0 < start < len(prev_checkpoints):
+        routes = prev_routes[:start]
+        checkpoints = prev_checkpoints[:start]
+        state.restore(prev_checkpoints[start])
+    else:
+        start = 0
+        routes = []
+        checkpoints = []
+        state.reset()
+    for i in range(start, len(order)):
+        checkpoints.append(state.snapshot())
+        routes.append(route_gate(items[order[i]], state, mapping, take_first_ms))
+    step = [r for route in routes for r in route]
+    return step, (order, routes, checkpoints)
 
 
 def initialize_to_remove(msf_faces, mapping):
@@ -262,6 +324,8 @@ def build_crit_dict(gates):
 
 
 def build_crit_dict_fast(gates: list[int]) -> dict[int, int]:
+    if isinstance(gates, GateTable):
+        return dict(enumerate(gates.crit.tolist()))
     crit_dict: dict[int, int] = {}
     last_id_per_qubit: dict[int, int] = {}
     for id in range(len(gates) - 1, -1, -1):
@@ -277,7 +341,7 @@ def build_crit_dict_fast(gates: list[int]) -> dict[int, int]:
     return crit_dict
 
 
-def dependent(step, remaining_gates):
+def dependent(step, remaining_gates, crit_dict):
     deps = 0
     for id, qubits, path in step:
         dependent = get_dependent_gates((id, qubits), remaining_gates)
@@ -285,6 +349,24 @@ def dependent(step, remaining_gates):
     return deps
 
 
+# reward name -> (reward function, whether it reads the gates left after the step)
+REWARDS = {
+    "gates_routed": (gates_routed, False),
+    "criticality": (criticality_fast, False),
+    "dependent": (dependent, True),
+}
+
+
+def step_reward(reward_name, step, gates, crit_dict):
+    """Reward of a routed step; the remaining gates are only built if the reward needs them."""
+    reward_func, needs_remaining = REWARDS[reward_name]
+    remaining_gates = None
+    if needs_remaining:
+        routed_ids = {x[0] for x in step}
+        remaining_gates = {k: v for k, v in gates.items() if k not in routed_ids}
+    return reward_func(step, remaining_gates, crit_dict)
+
+
 def best_realizable_set_found(
     gates,
     executable,
@@ -298,10 +380,15 @@ def best_realizable_set_found(
     cooling_rate=0.1,
     termination_temp=0.1,
     take_first_ms=False,
+    routing_state=None,
+    incremental=True,
 ):
     grid_len = arch["width"]
     grid_height = arch["height"]
     msf_faces = arch["magic_states"]
+    if routing_state is None:
+        routing_state = build_routing_state(arch, mapping)
+    items = list(executable.items())
     t_indices = [
         i for (i, (id, gate)) in enumerate(executable.items()) if len(gate) == 1
     ]
@@ -310,31 +397,9 @@ def best_realizable_set_found(
     ]
     if initial_order == "naive":
         best_order = cnot_indices + t_indices
-        best_step = try_order(
-            best_order,
-            executable,
-            grid_len,
-            grid_height,
-            msf_faces,
-            mapping,
-            take_first_ms,
-        )
-        current_order = best_order
-        current_step = best_step
     elif initial_order == "random":
         best_order = cnot_indices + t_indices
         random.shuffle(best_order)
-        best_step = try_order(
-            best_order,
-            executable,
-            grid_len,
-            grid_height,
-            msf_faces,
-            mapping,
-            take_first_ms,
-        )
-        current_order = best_order
-        current_step = best_step
     elif initial_order == "shortest_first":
         shortest_cnot = sorted(
             tuple(range(len(cnot_indices))),
@@ -358,31 +423,26 @@ def best_realizable_set_found(
         )
         shortest_first = shortest_cnot + shortest_t
         best_order = shortest_first
-        best_step = try_order(
-            best_order,
-            executable,
-            grid_len,
-            grid_height,
-            msf_faces,
-            mapping,
-            take_first_ms,
+
+    def route_order(order, trace):
+        if incremental:
+            return try_order_incremental(
+                order, items, routing_state, mapping, take_first_ms, trace
+            )
+        step = try_order(
+            order, items, routing_state, mapping, take_first_ms
         )
-        current_order = best_order
-        current_step = best_step
-    routed_ids = [x[0] for x in best_step]
-    best_remaining_gates = {k: v for k, v in gates.items() if k not in routed_ids}
-    name_to_func = {
-        "gates_routed": gates_routed,
-        "criticality": criticality_fast,
-        "dependent": dependent,
-    }
-
-    reward_func = name_to_func[reward_name]
+        return step, None
+
+    best_step, current_trace = route_order(best_order, None)
+    current_order = best_order
     orders_tried_count = 1
     if len(executable) < 2:
         return best_step, 1
+    best_reward = step_reward(reward_name, best_step, gates, crit_dict)
+    current_reward = best_reward
 
-    elif (len(cnot_indices) < 5 and len(t_indices) < 5) and cooling_rate != 1:
+    if (len(cnot_indices) < 5 and len(t_indices) < 5) and cooling_rate != 1:
         # print("exhaustive step")
         all_cnot_orders = itertools.permutations(cnot_indices)
         all_t_orders = itertools.permutations(t_indices)
@@ -392,27 +452,15 @@ def best_realizable_set_found(
         # print(sample_size, len(orders))
 
         orders_to_explore = orders[:sample_size]
+        trace = current_trace
         for cnot_order, t_order in orders_to_explore:
             order = list(cnot_order) + list(t_order)
-            new_step = try_order(
-                order,
-                executable,
-                grid_len,
-                grid_height,
-                msf_faces,
-                mapping,
-                take_first_ms,
-            )
+            new_step, trace = route_order(order, trace)
             orders_tried_count += 1
-            routed_ids = [x[0] for x in new_step]
-            new_remaining_gates = {
-                k: v for k, v in gates.items() if k not in routed_ids
-            }
-            # print(f"considering step {new_step}", f"reward: {reward_func(new_step, new_remaining_gates)}")
-            if reward_func(new_step, new_remaining_gates, crit_dict) > reward_func(
-                best_step, best_remaining_gates, crit_dict
-            ):
+            new_reward = step_reward(reward_name, new_step, gates, crit_dict)
+            if new_reward > best_reward:
                 best_step = new_step
+                best_reward = new_reward
         return best_step, orders_tried_count
 
     else:
@@ -430,38 +478,35 @@ def best_realizable_set_found(
                 )
                 ts[ind1], ts[ind2] = ts[ind2], ts[ind1]
             new_order = cnots + ts
-            new_step = try_order(
-                new_order,
-                executable,
-                grid_len,
-                grid_height,
-                msf_faces,
-                mapping,
-                take_first_ms,
-            )
+            new_step, new_trace = route_order(new_order, current_trace)
             orders_tried_count += 1
-            routed_ids = [x[0] for x in new_step]
-            new_remaining_gates = {
-                k: v for k, v in gates.items() if k not in routed_ids
-            }
-            delta_curr = reward_func(
-                current_step, best_remaining_gates, crit_dict
-            ) - reward_func(new_step, new_remaining_gates, crit_dict)
-            delta_best = reward_func(
-                best_step, best_remaining_gates, crit_dict
-            ) - reward_func(new_step, new_remaining_gates, crit_dict)
+            new_reward = step_reward(reward_name, new_step, gates, crit_dict)
+            delta_curr = current_reward - new_reward
+            delta_best = best_reward - new_reward
             if delta_curr < 0 or np.random.rand() < np.exp(-delta_curr / temperature):
                 current_order = new_order
-                current_step = new_step
+                current_trace = new_trace
+                current_reward = new_reward
             if delta_best < 0:
                 # print(len(best_step))
-                best_order = new_order
                 best_step = new_step
+                best_reward = new_reward
             temperature *= 1 - cooling_rate
         return best_step, orders_tried_count
 
 
-def sim_anneal_route(
+def sim_anneal_route(*args, **kwargs):
+    """
+    Route gates layer by layer, annealing the routing order of every step. Past the
+    deadline (a time.time() value) the remaining steps are routed greedily in the
+    naive order, so a schedule is always returned. Also returns the routing orders
+    tried per step, 0 for the greedy ones. Takes the arguments of route_steps.
+    """
+    routed = list(route_steps(*args, **kwargs))
+    return [step for step, _ in routed], [tried for _, tried in routed]
+
+
+def route_steps(
     gates,
     arch,
     mapping,
@@ -472,42 +517,89 @@ def sim_anneal_route(
     initial_order="random",
     reward_name="criticality",
     take_first_ms=True,
+    incremental=True,
+    deadline=None,
 ):
-    timesteps = []
-    grid_len = arch["width"]
-    grid_height = arch["height"]
-    msf_faces = arch["magic_states"]
+    """
+    sim_anneal_route as a generator: yields every step with the routing orders tried
+    for it as soon as it is routed, so callers can write it out without keeping the
+    schedule.
+    """
     mapping = {q: p for (q, p) in mapping}
-    gates_id_table = {i: gate for i, gate in enumerate(gates)}
     crit_dict = {}
     if temperature > termination_temp:
         crit_dict = build_crit_dict_fast(gates)
-    tried_steps = 0
-    while len(gates_id_table) != 0:
-        executable, remaining = executable_subset(gates_id_table)
+    routing_state = build_routing_state(arch, mapping)
+    frontier = GateFrontier(gates)
+    anneal = dict(
+        temperature=temperature,
+        cooling_rate=cooling_rate,
+        termination_temp=termination_temp,
+        initial_order=initial_order,
+    )
+    greedy = dict(
+        temperature=termination_temp,
+        cooling_rate=1,
+        termination_temp=termination_temp,
+        initial_order="naive",
+    )
+    while len(frontier.pending) != 0:
+        past_deadline = deadline is not None and time.time() > deadline
         step, tried = best_realizable_set_found(
-            gates_id_table,
-            executable,
+            frontier.pending,
+            frontier.executable(),
             arch,
             mapping,
             order_fraction=order_fraction,
             crit_dict=crit_dict,
-            temperature=temperature,
-            cooling_rate=cooling_rate,
-            termination_temp=termination_temp,
-            initial_order=initial_order,
             reward_name=reward_name,
             take_first_ms=take_first_ms,
+            routing_state=routing_state,
+            incremental=incremental,
+            **(greedy if past_deadline else anneal),
+        )
+        frontier.execute([x[0] for x in step])
+        yield step, 0 if past_deadline else tried
+
+
+class GateFrontier:
+    """Ready set of a gate list under per-qubit dependencies.
+
+    Every gate depends on the previous gate on each of its qubits, so a gate is
+    ready once it is the oldest pending gate on all of its qubits. Executing
+    gates advances the per-qubit heads and only their successors are checked,
+    instead of rescanning every pending gate at each step.
+    """
+
+    def __init__(self, gates):
+        self.gates = gates
+        self.pending = {i: gate for i, gate in enumerate(gates)}
+        self.queues = {}
+        for i, gate in enumerate(gates):
+            for q in gate:
+                self.queues.setdefault(q, []).append(i)
+        self.heads = {q: 0 for q in self.queues}
+        self.ready = [i for i in range(len(gates)) if self.is_ready(i)]
+
+    def is_ready(self, id):
+        return all(self.queues[q][self.heads[q]] == id for q in self.gates[id])
+
+    def executable(self):
+        return {id: self.gates[id] for id in self.ready}
+
+    def execute(self, ids):
+        """Mark ids as executed; ready gates that were not executed stay first."""
+        done = set(ids)
+        candidates = set()
+        for id in done:
+            del self.pending[id]
+            for q in self.gates[id]:
+                self.heads[q] += 1
+                if self.heads[q] < len(self.queues[q]):
+                    candidates.add(self.queues[q][self.heads[q]])
+        self.ready = [id for id in self.ready if id not in done] + sorted(
+            id for id in candidates if self.is_ready(id)
         )
-        tried_steps += tried
-        timesteps.append(step)
-        routed_ids = [x[0] for x in step]
-        not_executed = {
-            id: gates_id_table[id] for id in executable if id not in routed_ids
-        }
-        gates_id_table = {**not_executed, **remaining}
-    # print(f'routing orders tried {tried_steps}')
-    return timesteps, tried_steps
 
 
 def get_depth_by_qubit(gates):
@@ -1,364 +1,240 @@
 from pysat.card import *
+import gzip
+import multiprocessing
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
 import numpy as np
+from queue import Empty
 from pysat.solvers import Solver
+from .architecture import Architecture
+from .scmr_encoding import (
+    VarLayout,
+    all_executed_by,
+    edge_list_from_gate_list,
+    encode_k,
+    encode_steps,
+    extract_qubits,
+    gate_executed_once,
+    gate_links,
+    map_is_given,
+    placement_step,
+)
 
 
-def gate_has_time_step(gate_num, log_num, step_num, sem_vars, aux_vars, s):
-    for i in range(gate_num):
-        lits = [to_int(sem_vars, (False, "e", i, j)) for j in range(step_num)]
-        for clause in CardEnc.equals(lits=lits, bound=1, vpool=aux_vars).clauses:
-            s.add_clause(clause)
-
-
-def maps_are_injective(
+def solve_k(
     grid_len,
     grid_height,
-    gate_num,
-    log_num,
-    step_num,
     msf_faces,
     alg_qubits,
-    sem_vars,
-    aux_vars,
-    s,
-):
-    face_num = grid_len * grid_height
-    for k in range(step_num):
-        for i in range(log_num):
-            lits = [to_int(sem_vars, (False, "f", i, p, k)) for p in alg_qubits]
-            for clause in CardEnc.equals(lits, 1, vpool=aux_vars).clauses:
-                s.add_clause(clause)
-            for j in range(face_num):
-                if j not in alg_qubits:
-                    s.add_clause([to_int(sem_vars, (True, "f", i, j, k))])
-        for j in alg_qubits:
-            lits = [to_int(sem_vars, (False, "f", q, j, k)) for q in range(log_num)]
-            for clause in CardEnc.atmost(lits, 1, vpool=aux_vars).clauses:
-                s.add_clause(clause)
-
-
-def map_is_given(map_dict, sem_vars, s):
-    for q, p in map_dict.items():
-        s.add_clause([to_int(sem_vars, (False, "f", q, p, 0))])
-
-
-def magic_states_preserved(
-    grid_len, grid_height, gate_num, log_num, step_num, msf_faces, sem_vars, aux_vars, s
-):
-    clauses = [
-        [to_int(sem_vars, (True, "l", f, u, g, k))]
-        for f in msf_faces
-        for g in range(gate_num)
-        for k in range(step_num)
-        for u in neighbors(f, grid_len, grid_height, omitted_edges=[])
-    ]
-    for clause in clauses:
-        s.add_clause(clause)
-
-
-def data_preserved(
-    grid_len, grid_height, gate_num, log_num, step_num, msf_faces, sem_vars, aux_vars, s
-):
-    clauses = [
-        [
-            to_int(sem_vars, (True, "l", f, u, g, k)),
-            to_int(sem_vars, (True, "l", v, f, g, k)),
-            to_int(sem_vars, (True, "f", q, f, k)),
-        ]
-        for f in range(grid_len * grid_height)
-        for g in range(gate_num)
-        for k in range(step_num)
-        for q in range(log_num)
-        for u in neighbors(f, grid_len, grid_height, omitted_edges=[])
-        for v in neighbors(f, grid_len, grid_height, omitted_edges=[])
-    ]
-    for clause in clauses:
-        s.add_clause(clause)
-
-
-# this just imposes a fixed mapping for now
-def swap_effect_constraint(
-    grid_len, grid_height, gate_num, log_num, step_num, sem_vars, s
-):
-    face_num = grid_len * grid_height
-    for k in range(step_num - 1):
-        for i in range(log_num):
-            for j in range(face_num):
-                for j2 in range(face_num):
-                    if j != j2:
-                        clause = [(True, "f", i, j, k), (True, "f", i, j2, k + 1)]
-                        flattened_clause = [to_int(sem_vars, lit) for lit in clause]
-                        s.add_clause(flattened_clause)
-
-
-# def swap_effect_constraint(grid_len, grid_height, gate_num, log_num, step_num, node_num):
-#     clauses = []
-#     face_num = grid_len * grid_height
-#     for k in range(step_num-1):
-#         for i in range(log_num):
-#             for j in range(face_num):
-#                     clause = [(True, 'f', i, j, k),(False, 'f', i, j, k+1)]
-#                     flattened_clause = [flattenedIndex(lit,  gate_num, log_num, step_num, node_num) for lit in clause]
-#                     clauses.append(flattened_clause)
-#     return clauses
-
-
-def dependencies_respected(edge_list, gate_num, log_num, step_num, sem_vars, s):
-    clauses = []
-    for k in range(step_num):
-        for edge in edge_list:
-            clause = [(True, "e", edge[1], k)] + [
-                (False, "e", edge[0], k1) for k1 in range(k)
-            ]
-            flattened_clause = [to_int(sem_vars, lit) for lit in clause]
-            s.add_clause(flattened_clause)
-
-
-def braids_nonintersecting(
-    grid_len, grid_height, gate_num, log_num, step_num, sem_vars, aux_vars, s
-):
-    face_num = grid_len * grid_height
-    for n in range(face_num):
-        for k in range(step_num):
-            lits = [to_int(sem_vars, (False, "b", n, i, k)) for i in range(gate_num)]
-            for clause in CardEnc.atmost(lits, 1, vpool=aux_vars).clauses:
-                s.add_clause(clause)
-
-
-def edges_match_colors(
-    grid_len, grid_height, omitted_edges, gate_num, log_num, step_num, sem_vars, s
+    omitted_edges,
+    gate_list,
+    step_num,
+    fixed_map,
+    bandwidth,
+    region_margin=None,
+    static_map=True,
+    solver="cd",
+    card_enc=EncType.seqcounter,
+    deadline=None,
 ):
-    face_num = grid_len * grid_height
-    for j in range(face_num):
-        for k in range(step_num):
-            for g in range(gate_num):
-                for n in neighbors(j, grid_len, grid_height, omitted_edges):
-                    clause = [(False, "b", n, g, k), (True, "l", n, j, g, k)]
-                    flattened_clause = [to_int(sem_vars, lit) for lit in clause]
-                    s.add_clause(flattened_clause)
-                    clause = [(False, "b", j, g, k), (True, "l", n, j, g, k)]
-                    flattened_clause = [to_int(sem_vars, lit) for lit in clause]
-                    s.add_clause(flattened_clause)
-                    clause = [(True, "l", j, n, g, k), (True, "l", n, j, g, k)]
-                    flattened_clause = [to_int(sem_vars, lit) for lit in clause]
-                    s.add_clause(flattened_clause)
-
-
-def path_control_target(
+    """
+    Verified model of a step_num step schedule, False if there is none, or None if
+    the solver was interrupted at deadline (see solve_before).
+    """
+    with Solver(name=solver) as s:
+        vpool = encode_k(
+            grid_len,
+            grid_height,
+            msf_faces,
+            alg_qubits,
+            omitted_edges,
+            gate_list,
+            step_num,
+            fixed_map,
+            bandwidth,
+            s,
+            region_margin,
+            static_map,
+            card_enc,
+        )
+        (s.nof_clauses())
+        status = solve_before(s, deadline)
+        if status:
+            model = vpool.decode(s.get_model())
+            verify(
+                model,
+                grid_len,
+                grid_height,
+                msf_faces,
+                gate_list,
+                step_num,
+                static_map,
+            )
+            return model
+        return status
+
+
+# conflicts per solve_limited call when a solver can't be interrupted
+CONFLICT_SLICE = 1000
+
+
+def solve_before(solver, deadline, assumptions=[]):
+    """
+    solver.solve(assumptions), interrupted when time.time() reaches deadline: True,
+    False, or None if the budget ran out first. The interrupt comes from a timer
+    thread, so unlike signal.alarm this also works outside the main thread. Solvers
+    without interrupt support (CaDiCaL) instead solve in slices of CONFLICT_SLICE
+    conflicts and check deadline between them; Lingeling, which supports neither,
+    only checks deadline before solving.
+    """
+    remaining = None if deadline is None else deadline - time.time()
+    if remaining is not None and remaining <= 0:
+        return None
+    if remaining is None:
+        return solver.solve(assumptions=assumptions)
+    if not interruptible(solver):
+        return solve_in_slices(solver, deadline, assumptions)
+    timer = threading.Timer(remaining, solver.interrupt)
+    timer.start()
+    try:
+        return solver.solve_limited(assumptions=assumptions, expect_interrupt=True)
+    finally:
+        timer.cancel()
+        solver.clear_interrupt()
+
+
+def solve_in_slices(solver, deadline, assumptions):
+    while time.time() < deadline:
+        try:
+            solver.conf_budget(CONFLICT_SLICE)
+            status = solver.solve_limited(assumptions=assumptions)
+        except NotImplementedError:
+            return solver.solve(assumptions=assumptions)
+        if status is not None:
+            return status
+    return None
+
+
+def interruptible(solver):
+    try:
+        solver.clear_interrupt()
+    except NotImplementedError:
+        return False
+    return True
+
+
+class DimacsWriter:
+    """
+    Clause sink with the add_clause interface of a pysat Solver that streams clauses
+    to a DIMACS file, gzip-compressed if the path ends in .gz. Clauses go to a
+    temporary file first, since the header needs the final variable and clause counts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.body = tempfile.TemporaryFile("w+")
+        self.clauses = 0
+
+    def add_clause(self, clause):
+        writeClause(self.body, clause)
+        self.clauses += 1
+
+    def append_formula(self, clauses):
+        self.body.write("".join(f" {' '.join(map(str, c))} 0\n" for c in clauses))
+        self.clauses += len(clauses)
+
+    def nof_clauses(self):
+        return self.clauses
+
+    def close(self, nof_vars):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        self.body.seek(0)
+        with opener(self.path, "wt") as f:
+            f.write(f"p cnf {nof_vars} {self.clauses}\n")
+            shutil.copyfileobj(self.body, f)
+        self.body.close()
+
+
+def write_varmap(vpool, path):
+    """Sidecar listing "id name index..." for every semantic variable of vpool."""
+    with open(path, "w") as f:
+        for vid, obj in vpool.items():
+            f.write(f"{vid} {' '.join(map(str, obj))}\n")
+
+
+def read_varmap(path):
+    varmap = {}
+    with open(path) as f:
+        for line in f:
+            vid, name, *index = line.split()
+            varmap[int(vid)] = (name, *map(int, index))
+    return varmap
+
+
+def write_dimacs(
+    path,
     grid_len,
     grid_height,
+    msf_faces,
+    alg_qubits,
     omitted_edges,
     gate_list,
-    gate_num,
-    log_num,
     step_num,
-    msf_faces,
-    sem_vars,
-    aux_vars,
-    s,
-):
-    clauses = []
-    face_num = grid_len * grid_height
-    for g in range(len(gate_list)):
-        if g >= len(gate_list):
-            # index = g-len(gate_list)
-            # c = index // face_num
-            # t = index % face_num
-            # for k in range(step_num):
-            #     lits_1 =  [to_int(sem_vars, (False, 'l', n, t, g, k)) for n in neighbors(t, grid_len+1, grid_height+1, omitted_edges)]
-            #     exact_1 = CardEnc.equals(lits_1, 1, vpool=aux_vars)
-            #     for clause in exact_1.clauses:
-            #         clause.append(to_int(sem_vars, (True, 'e', g, k)))
-            #         s.add_clause(clause)
-            #     no_out =  [to_int(sem_vars, (True, 'b', t,  g, k))]
-            #     s.add_clause(no_out)
-            #     for j in range(node_num):
-            #         lits_in = [to_int(sem_vars, (False, "l", n, j, g, k)) for n in neighbors(j, grid_len+1, grid_height+1, omitted_edges)]
-            #         exact_in = CardEnc.equals(lits_in,1, vpool=aux_vars)
-            #         lits_out = [to_int(sem_vars, (False, "l", j, n, g, k)) for n in neighbors(j, grid_len+1, grid_height+1, omitted_edges)]
-            #         exact_out = CardEnc.equals(lits_out,1, vpool=aux_vars)
-            #         for clause in exact_in.clauses:
-            #             if j != c:
-            #                 clause.append(to_int(sem_vars, (True, 'b', j, g, k)))
-            #                 s.add_clause(clause)
-            #         for clause in exact_out.clauses:
-            #                 clause.append(to_int(sem_vars, (True, 'b', j, g, k)))
-            #                 s.add_clause(clause)
-            raise NotImplementedError
-        elif len(gate_list[g]) == 2:
-            c, t = gate_list[g]
-            for k in range(step_num):
-                for j in range(face_num):
-                    lits_1 = [
-                        to_int(sem_vars, (False, "l", n, j, g, k))
-                        for n in horizontal_neighbors(
-                            j, grid_len, grid_height, omitted_edges
-                        )
-                    ]
-                    exact_1 = CardEnc.equals(lits_1, 1, vpool=aux_vars)
-                    for clause in exact_1.clauses:
-                        clause.append(to_int(sem_vars, (True, "e", g, k)))
-                        clause.append(to_int(sem_vars, (True, "f", t, j, k)))
-                        s.add_clause(clause)
-                    lits_1_ctrl = [
-                        to_int(sem_vars, (False, "l", j, n, g, k))
-                        for n in vertical_neighbors(
-                            j, grid_len, grid_height, omitted_edges
-                        )
-                    ]
-                    exact_1_ctrl = CardEnc.equals(lits_1_ctrl, 1, vpool=aux_vars)
-                    for clause in exact_1_ctrl.clauses:
-                        clause.append(to_int(sem_vars, (True, "e", g, k)))
-                        clause.append(to_int(sem_vars, (True, "f", c, j, k)))
-                        s.add_clause(clause)
-                    for n in neighbors(j, grid_len, grid_height, omitted_edges):
-                        no_out = [
-                            to_int(sem_vars, (True, "l", j, n, g, k)),
-                            to_int(sem_vars, (True, "f", t, j, k)),
-                        ]
-                        s.add_clause(no_out)
-                    lits_in = [
-                        to_int(sem_vars, (False, "l", n, j, g, k))
-                        for n in neighbors(j, grid_len, grid_height, omitted_edges)
-                    ]
-                    exact_in = CardEnc.equals(lits_in, 1, vpool=aux_vars)
-                    lits_out = [
-                        to_int(sem_vars, (False, "l", j, n, g, k))
-                        for n in neighbors(j, grid_len, grid_height, omitted_edges)
-                    ]
-                    exact_out = CardEnc.equals(lits_out, 1, vpool=aux_vars)
-                    for clause in exact_in.clauses:
-                        clause.append(to_int(sem_vars, (True, "b", j, g, k)))
-                        clause.append(to_int(sem_vars, (False, "f", c, j, k)))
-                        # clause.append(to_int(sem_vars, (True, 'e', g, k),  gate_num, log_num, step_num, node_num))
-                        s.add_clause(clause)
-                    for clause in exact_out.clauses:
-                        clause.append(to_int(sem_vars, (True, "b", j, g, k)))
-                        clause.append(to_int(sem_vars, (False, "f", t, j, k)))
-                        s.add_clause(clause)
-
-        else:
-            t = gate_list[g][0]
-            for k in range(step_num):
-                for j in range(face_num):
-                    lits_1 = [
-                        to_int(sem_vars, (False, "l", j, n, g, k))
-                        for n in vertical_neighbors(
-                            j, grid_len, grid_height, omitted_edges
-                        )
-                    ]
-                    exact_1 = CardEnc.equals(lits_1, 1, vpool=aux_vars)
-                    for clause in exact_1.clauses:
-                        clause.append(to_int(sem_vars, (True, "e", g, k)))
-                        clause.append(to_int(sem_vars, (True, "f", t, j, k)))
-                        s.add_clause(clause)
-                    lits_1_msf = [
-                        to_int(sem_vars, (False, "l", n, j, g, k))
-                        for m in msf_faces
-                        for n in horizontal_neighbors(
-                            m, grid_len, grid_height, omitted_edges
-                        )
-                    ]
-                    exact_1_msf = CardEnc.equals(lits_1_msf, 1, vpool=aux_vars)
-                    for clause in exact_1_msf.clauses:
-                        clause.append(to_int(sem_vars, (True, "e", g, k)))
-                        s.add_clause(clause)
-                    lits_in = [
-                        to_int(sem_vars, (False, "l", n, j, g, k))
-                        for n in neighbors(j, grid_len, grid_height, omitted_edges)
-                    ]
-                    exact_in = CardEnc.equals(lits_in, 1, vpool=aux_vars)
-                    lits_out = [
-                        to_int(sem_vars, (False, "l", j, n, g, k))
-                        for n in neighbors(j, grid_len, grid_height, omitted_edges)
-                    ]
-                    exact_out = CardEnc.equals(lits_out, 1, vpool=aux_vars)
-                    for clause in exact_in.clauses:
-                        clause.append(to_int(sem_vars, (True, "b", j, g, k)))
-                        clause.append(to_int(sem_vars, (False, "f", t, j, k)))
-                        # clause.append(to_int(sem_vars, (True, 'e', g, k),  gate_num, log_num, step_num, node_num))
-                        s.add_clause(clause)
-                    for clause in exact_out.clauses:
-                        if j not in msf_faces:
-                            clause.append(to_int(sem_vars, (True, "b", j, g, k)))
-                            s.add_clause(clause)
-
-
-def bandwidth_constraint(
-    gate_list, gate_num, log_num, step_num, bandwidth, sem_vars, aux_vars, s
+    fixed_map=None,
+    bandwidth=None,
+    region_margin=None,
+    static_map=True,
+    card_enc=EncType.seqcounter,
 ):
-    if bandwidth:
-        t_indices = [i for i in range(len(gate_list)) if len(gate_list[i]) == 1]
-        for k in range(step_num):
-            lits = [to_int(sem_vars, (False, "e", t, k)) for t in t_indices]
-            for clause in CardEnc.atmost(lits, bandwidth, vpool=aux_vars).clauses:
-                s.add_clause(clause)
-
-
-def vertical_neighbors(n, grid_len, grid_height, omitted_edges):
-    neighbors = []
-    down = n + grid_len
-    up = n - grid_len
-    if (
-        n // grid_len != 0
-        and (n, up) not in omitted_edges
-        and (up, n) not in omitted_edges
-    ):
-        neighbors.append(up)
-    if (
-        n // grid_len != grid_height - 1
-        and (n, down) not in omitted_edges
-        and (down, n) not in omitted_edges
-    ):
-        neighbors.append(down)
-    return neighbors
-
-
-def horizontal_neighbors(n, grid_len, grid_height, omitted_edges):
-    neighbors = []
-    left = n - 1
-    right = n + 1
-    if (
-        n % grid_len != 0
-        and (n, left) not in omitted_edges
-        and (left, n) not in omitted_edges
-    ):
-        neighbors.append(left)
-    if (
-        n % grid_len != grid_len - 1
-        and (n, right) not in omitted_edges
-        and (right, n) not in omitted_edges
-    ):
-        neighbors.append(right)
-    return neighbors
-
-
-def neighbors(n, grid_len, grid_height, omitted_edges):
-    return horizontal_neighbors(
-        n, grid_len, grid_height, omitted_edges
-    ) + vertical_neighbors(n, grid_len, grid_height, omitted_edges)
-
-
-def edge_list_from_gate_list(gate_list):
-    edge_list = []
-    qubit_depth = {}
-    for i in range(len(gate_list)):
-        for qubit in gate_list[i]:
-            if qubit in qubit_depth:
-                edge_list.append((qubit_depth[qubit], i))
-            qubit_depth[qubit] = i
-    return edge_list
-
-
-def extract_qubits(gate_list):
-    qubits = set()
-    for gate in gate_list:
-        for qubit in gate:
-            qubits.add(qubit)
-    return qubits
-
-
-def solve_k(
+    """Stream the CNF for step_num steps to path, and its variable map to path.vars."""
+    writer = DimacsWriter(path)
+    vpool = encode_k(
+        grid_len,
+        grid_height,
+        msf_faces,
+        alg_qubits,
+        omitted_edges,
+        gate_list,
+        step_num,
+        fixed_map,
+        bandwidth,
+        writer,
+        region_margin,
+        static_map,
+        card_enc,
+    )
+    writer.close(vpool.top)
+    write_varmap(vpool, path + ".vars")
+    return path + ".vars"
+
+
+def read_solver_output(output):
+    """
+    Positive literals of the model in SAT competition style solver output
+    ("s ..." and "v ..." lines), or False if the formula is unsatisfiable.
+    """
+    status = None
+    model = []
+    for line in output.splitlines():
+        if line.startswith("s "):
+            status = line[2:].strip()
+        elif line.startswith("v "):
+            model.extend(int(lit) for lit in line[2:].split() if int(lit) > 0)
+    if status == "UNSATISFIABLE":
+        return False
+    if status != "SATISFIABLE":
+        raise RuntimeError(f"SAT solver gave no answer (status {status})")
+    return model
+
+
+def solve_k_external(
+    command,
+    path,
     grid_len,
     grid_height,
     msf_faces,
@@ -366,93 +242,216 @@ def solve_k(
     omitted_edges,
     gate_list,
     step_num,
-    fixed_map,
-    bandwidth,
+    fixed_map=None,
+    bandwidth=None,
+    region_margin=None,
+    static_map=True,
+    deadline=None,
 ):
-    gate_num = len(gate_list)
-    log_num = len(extract_qubits(gate_list))
-    face_num = grid_len * grid_height
-    # mappable_faces = [p for p in range(face_num) if p not in msf_faces]
-    # map_face_num = len(mappable_faces)
-    num_E = (gate_num) * step_num
-    num_B = face_num * (gate_num) * step_num
-    num_F = log_num * face_num * step_num
-    num_L = face_num * face_num * (gate_num) * step_num
-    top = num_E + num_B + num_F + num_L
-    edge_list = edge_list_from_gate_list(gate_list)
-    aux_vars = IDPool(start_from=top + 1)
-    vpool = IDPool()
-    with Solver(name="cd") as s:
-        gate_has_time_step(gate_num, log_num, step_num, vpool, aux_vars, s)
-        if fixed_map:
-            map_is_given(fixed_map, vpool, s)
-        maps_are_injective(
-            grid_len,
-            grid_height,
-            gate_num,
-            log_num,
-            step_num,
-            msf_faces,
-            alg_qubits,
-            vpool,
-            aux_vars,
-            s,
+    """
+    solve_k through a SAT solver binary: the CNF is streamed to the DIMACS file path,
+    `command` (e.g. "kissat -q") is run on it, and the model is decoded with the
+    variable map sidecar. The solver is killed at deadline, returning None.
+    """
+    varmap_path = write_dimacs(
+        path,
+        grid_len,
+        grid_height,
+        msf_faces,
+        alg_qubits,
+        omitted_edges,
+        gate_list,
+        step_num,
+        fixed_map,
+        bandwidth,
+        region_margin,
+        static_map,
+    )
+    timeout = None if deadline is None else max(deadline - time.time(), 0)
+    try:
+        result = subprocess.run(
+            shlex.split(command) + [path],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
         )
-        data_preserved(
-            grid_len,
-            grid_height,
-            gate_num,
-            log_num,
-            step_num,
-            msf_faces,
-            vpool,
-            aux_vars,
-            s,
-        )
-        magic_states_preserved(
-            grid_len,
-            grid_height,
-            gate_num,
-            log_num,
-            step_num,
-            msf_faces,
-            vpool,
-            aux_vars,
-            s,
-        )
-        dependencies_respected(edge_list, gate_num, log_num, step_num, vpool, s)
-        braids_nonintersecting(
-            grid_len, grid_height, gate_num, log_num, step_num, vpool, aux_vars, s
-        )
-        path_control_target(
+    except subprocess.TimeoutExpired:
+        return None
+    lits = read_solver_output(result.stdout)
+    if not lits:
+        return False
+    varmap = read_varmap(varmap_path)
+    model = [varmap[lit] for lit in lits if lit in varmap]
+    verify(model, grid_len, grid_height, msf_faces, gate_list, step_num, static_map)
+    return model
+
+
+class StepEncoding:
+    """
+    A single solver kept alive across step counts. Step layers are only ever added,
+    and solving for k steps assumes a(k) instead of re-encoding steps 0..k-1.
+    """
+
+    def __init__(
+        self,
+        grid_len,
+        grid_height,
+        msf_faces,
+        alg_qubits,
+        omitted_edges,
+        gate_list,
+        fixed_map=None,
+        bandwidth=None,
+        region_margin=None,
+        static_map=True,
+        log_num=None,
+        solver="cd",
+        card_enc=EncType.seqcounter,
+    ):
+        self.grid_len = grid_len
+        self.grid_height = grid_height
+        self.msf_faces = msf_faces
+        self.alg_qubits = alg_qubits
+        self.omitted_edges = omitted_edges
+        self.gate_list = gate_list
+        self.bandwidth = bandwidth
+        self.static_map = static_map
+        self.log_num = log_num
+        self.card_enc = card_enc
+        self.edge_list = edge_list_from_gate_list(gate_list)
+        self.links = gate_links(
             grid_len,
             grid_height,
             omitted_edges,
             gate_list,
-            gate_num,
-            log_num,
-            step_num,
             msf_faces,
-            vpool,
-            aux_vars,
-            s,
+            fixed_map,
+            region_margin,
         )
-        bandwidth_constraint(
-            gate_list, gate_num, log_num, step_num, bandwidth, vpool, aux_vars, s
+        self.vpool = VarLayout(
+            self.links,
+            grid_len * grid_height,
+            log_num or len(extract_qubits(gate_list)),
+            static_map,
+            fixed_map,
         )
-        swap_effect_constraint(
-            grid_len, grid_height, gate_num, log_num, step_num, vpool, s
+        self.solver = Solver(name=solver)
+        self.step_num = 0
+        self.assumptions = {}
+        if fixed_map:
+            map_is_given(fixed_map, self.vpool, self.solver)
+
+    def extend(self, step_num):
+        """Add the clauses of steps self.step_num..step_num-1."""
+        if step_num <= self.step_num:
+            return
+        encode_steps(
+            self.grid_len,
+            self.grid_height,
+            self.msf_faces,
+            self.alg_qubits,
+            self.omitted_edges,
+            self.gate_list,
+            self.edge_list,
+            self.links,
+            self.step_num,
+            step_num,
+            self.bandwidth,
+            self.vpool,
+            self.vpool.pool,
+            self.solver,
+            self.static_map,
+            self.log_num,
+            self.card_enc,
         )
-        edges_match_colors(
-            grid_len, grid_height, omitted_edges, gate_num, log_num, step_num, vpool, s
+        gate_executed_once(
+            len(self.gate_list), step_num, self.vpool, self.solver, self.step_num
         )
-        (s.nof_clauses())
-        s.solve()
-        if s.get_status():
-            model = [vpool.obj(lit) for lit in s.get_model() if vpool.obj((lit))]
-            verify(model, grid_len, grid_height, msf_faces, gate_list, step_num)
-            return model
-        return s.get_status()
+        self.step_num = step_num
+
+    def solve_k(self, k, deadline=None):
+        """
+        Return a verified model scheduling every gate within k steps, False if there
+        is none, or None if deadline passed first.
+        """
+        self.extend(k)
+        if k not in self.assumptions:
+            self.assumptions[k] = all_executed_by(
+                len(self.gate_list), k, self.vpool, self.solver
+            )
+        status = solve_before(self.solver, deadline, [self.assumptions[k]])
+        if not status:
+            return status
+        model = self.vpool.decode(self.solver.get_model())
+        verify(
+            model,
+            self.grid_len,
+            self.grid_height,
+            self.msf_faces,
+            self.gate_list,
+            k,
+            self.static_map,
+        )
+        return model
+
+    def delete(self):
+        self.solver.delete()
+
+
+def linear_search(encoding, lower, limit, deadline=None):
+    """
+    Try k = lower, lower+1, ... up to limit; return (k, model), (None, False) if
+    there is no schedule, or (None, None) if deadline passed before finding one.
+    """
+    for k in range(lower, limit + 1):
+        model = encoding.solve_k(k, deadline)
+        if model is None:
+            return None, None
+        if model:
+            return k, model
+    return None, False
+
+
+def galloping_search(encoding, lower, limit, upper_bound=None, deadline=None):
+    """
+    Smallest k in [lower, limit] with a schedule, as (k, model) or (None, False).
+    Starts from upper_bound if given (e.g. the DASCOT step count), else gallops up from
+    lower with doubling increments, then bisects between the last UNSAT and SAT k.
+    Anytime: if deadline passes, returns the best schedule found so far, or
+    (None, None) if there is none yet.
+    """
+    hi, best = None, False
+    if upper_bound is not None and lower <= upper_bound <= limit:
+        best = encoding.solve_k(upper_bound, deadline)
+        if best is None:
+            return None, None
+        if best:
+            hi = upper_bound
+        else:
+            lower = upper_bound + 1
+    jump = 1
+    while not best:
+        if lower > limit:
+            return None, False
+        k = min(lower + jump - 1, limit)
+        best = encoding.solve_k(k, deadline)
+        if best is None:
+            return None, None
+        if best:
+            hi = k
+        else:
+            lower = k + 1
+            jump *= 2
+    while lower < hi:
+        mid = (lower + hi) // 2
+        model = encoding.solve_k(mid, deadline)
+        if model is None:
+            break
+        if model:
+            hi, best = mid, model
+        else:
+            lower = mid + 1
+    return hi, best
 
 
 def solve(
@@ -465,64 +464,312 @@ def solve(
     fixed_map=None,
     bandwidth=None,
     start_from=1,
+    search="incremental",
+    upper_bound=None,
+    region_margin=None,
+    static_map=True,
+    portfolio=None,
+    external_solver=None,
+    dimacs_path=None,
+    deadline=None,
+    solver="cd",
 ):
-    solved = False
-    step_num = start_from - 1
-    while not solved:
-        step_num += 1
-        if step_num > len(gates):
-            print("no sol")
-            return (-1, "no solution")
-        solved = solve_k(
+    """
+    Find a schedule with the fewest steps, starting the search at start_from steps.
+    search is "rebuild" (new CNF per step count), "incremental" (one solver, step
+    counts tried in increasing order), "binary" (one solver, galloping/bisection,
+    optionally starting from a known feasible upper_bound), "portfolio" (see
+    solve_parallel, portfolio defaults to PORTFOLIO) or "external" (a new DIMACS file
+    per step count, written to dimacs_path or a temporary directory and solved by
+    the external_solver command, see solve_k_external). region_margin only
+    applies with a fixed_map, see gate_links. static_map uses one set of placement
+    variables for all steps; fixed_map pins it, e.g. to a DASCOT phased map.
+    deadline (a time.time() value) bounds the solver calls; if it passes, the best
+    schedule found so far is returned (only "binary" finds schedules above the
+    optimum), or (-1, "timeout") if there is none. solver is the pysat solver of the
+    "rebuild", "incremental" and "binary" searches. CaDiCaL ("cd") can't be
+    interrupted, so it checks the deadline between slices of conflicts; Glucose
+    ("g4") is interrupted by a timer, see solve_before.
+    """
+    if search == "portfolio":
+        return solve_parallel(
+            gates,
+            msf_faces,
+            alg_qubits,
+            grid_len,
+            grid_height,
+            omitted_edges,
+            fixed_map,
+            bandwidth,
+            start_from,
+            portfolio or PORTFOLIO,
+            region_margin,
+            static_map,
+            deadline,
+        )
+    if search == "external":
+        with tempfile.TemporaryDirectory() as tmp:
+            path = dimacs_path or os.path.join(tmp, "scmr.cnf")
+            for step_num in range(start_from, len(gates) + 1):
+                solved = solve_k_external(
+                    external_solver,
+                    path,
+                    grid_len,
+                    grid_height,
+                    msf_faces,
+                    alg_qubits,
+                    omitted_edges,
+                    gates,
+                    step_num,
+                    fixed_map,
+                    bandwidth,
+                    region_margin,
+                    static_map,
+                    deadline,
+                )
+                if solved is None:
+                    return timed_out()
+                if solved:
+                    return interpret_model(solved, gates, step_num)
+        print("no sol")
+        return (-1, "no solution")
+    if search == "rebuild":
+        solved = False
+        step_num = start_from - 1
+        while not solved:
+            step_num += 1
+            if step_num > len(gates):
+                print("no sol")
+                return (-1, "no solution")
+            solved = solve_k(
+                grid_len,
+                grid_height,
+                msf_faces,
+                alg_qubits,
+                omitted_edges,
+                gates,
+                step_num,
+                fixed_map,
+                bandwidth,
+                region_margin,
+                static_map,
+                solver=solver,
+                deadline=deadline,
+            )
+            if solved is None:
+                return timed_out()
+        return interpret_model(solved, gates, step_num)
+    encoding = StepEncoding(
+        grid_len,
+        grid_height,
+        msf_faces,
+        alg_qubits,
+        omitted_edges,
+        gates,
+        fixed_map,
+        bandwidth,
+        region_margin,
+        static_map,
+        solver=solver,
+    )
+    try:
+        if search == "incremental":
+            step_num, solved = linear_search(
+                encoding, start_from, len(gates), deadline
+            )
+        elif search == "binary":
+            step_num, solved = galloping_search(
+                encoding, start_from, len(gates), upper_bound, deadline
+            )
+        else:
+            raise ValueError(f"Unsupported search: {search}")
+    finally:
+        encoding.delete()
+    if solved is None:
+        return timed_out()
+    if not solved:
+        print("no sol")
+        return (-1, "no solution")
+    return interpret_model(solved, gates, step_num)
+
+
+def timed_out():
+    print("timeout")
+    return (-1, "timeout")
+
+
+def window_gates(remaining, gate_list, window):
+    """
+    The gates among `remaining` (ids in circuit order) in their first `window` ASAP
+    dependency layers, and the number of layers they span.
+    """
+    sub = [gate_list[i] for i in remaining]
+    layer = [0] * len(sub)
+    for a, b in edge_list_from_gate_list(sub):
+        layer[b] = max(layer[b], layer[a] + 1)
+    ids = [remaining[i] for i in range(len(sub)) if layer[i] < window]
+    return ids, min(window, max(layer) + 1)
+
+
+def solve_windowed(
+    gates,
+    msf_faces,
+    alg_qubits,
+    grid_len,
+    grid_height,
+    window=4,
+    commit=2,
+    omitted_edges=[],
+    fixed_map=None,
+    bandwidth=None,
+    region_margin=None,
+    deadline=None,
+    solver="cd",
+):
+    """
+    Sliding-horizon variant of solve for long circuits: schedule the gates of the
+    next `window` dependency layers optimally, keep the first `commit` steps and
+    slide forward. Unless fixed_map is given, the first window also places every
+    logical qubit and later windows keep that placement. Returns (-1, "timeout")
+    if deadline passes before the last window is solved. solver is as for solve.
+    """
+    log_num = len(extract_qubits(gates))
+    remaining = list(range(len(gates)))
+    steps = []
+    while remaining:
+        ids, depth = window_gates(remaining, gates, window)
+        sub = [gates[i] for i in ids]
+        encoding = StepEncoding(
             grid_len,
             grid_height,
             msf_faces,
             alg_qubits,
             omitted_edges,
-            gates,
-            step_num,
+            sub,
             fixed_map,
             bandwidth,
+            region_margin,
+            log_num=log_num,
+            solver=solver,
         )
-    solution = interpret_model(solved, gates, step_num)
-    return solution
+        try:
+            step_num, model = linear_search(encoding, depth, len(sub), deadline)
+        finally:
+            encoding.delete()
+        if model is None:
+            return timed_out()
+        if not model:
+            print("no sol")
+            return (-1, "no solution")
+        map, window_steps = interpret_model(model, sub, step_num)
+        if fixed_map is None:
+            fixed_map = dict(map)
+        if len(ids) < len(remaining):
+            window_steps = window_steps[:commit]
+        done = set()
+        for step in window_steps:
+            steps.append([(ids[j], gate, path) for j, gate, path in step])
+            done.update(ids[j] for j, _, _ in step)
+        remaining = [i for i in remaining if i not in done]
+    return list(fixed_map.items()), steps
+
+
+# (solver name, cardinality encoding) pairs raced by solve_parallel
+PORTFOLIO = [
+    ("cd", EncType.seqcounter),
+    ("cd", EncType.totalizer),
+    ("g4", EncType.seqcounter),
+    ("mcb", EncType.cardnetwrk),
+]
+
+
+def portfolio_worker(queue, solver, card_enc, args, kwargs):
+    try:
+        result = solve_k(*args, solver=solver, card_enc=card_enc, **kwargs)
+    except Exception as e:
+        result = e
+    queue.put(result)
+
+
+def solve_k_portfolio(args, kwargs, portfolio=PORTFOLIO, deadline=None):
+    """
+    Run solve_k(*args, **kwargs) for every (solver, card_enc) of the portfolio in its
+    own process and return the first answer (model or False), killing the others.
+    Returns None if no answer arrives before deadline. Only raises if every member
+    of the portfolio failed.
+    """
+    if not portfolio:
+        raise ValueError("The portfolio needs at least one (solver, card_enc) pair")
+    queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=portfolio_worker,
+            args=(queue, solver, card_enc, args, kwargs),
+            daemon=True,
+        )
+        for solver, card_enc in portfolio
+    ]
+    for w in workers:
+        w.start()
+    errors = []
+    try:
+        for _ in workers:
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            try:
+                result = queue.get(timeout=timeout)
+            except Empty:
+                return None
+            if not isinstance(result, Exception):
+                return result
+            errors.append(result)
+        raise RuntimeError(
+            f"Every solver of the portfolio failed: {errors}"
+        ) from errors[-1]
+    finally:
+        for w in workers:
+            w.kill()
+            w.join()
 
 
 def solve_parallel(
     gates,
     msf_faces,
+    alg_qubits,
     grid_len,
     grid_height,
-    fname,
+    omitted_edges=[],
+    fixed_map=None,
     bandwidth=None,
-    start_from=None,
-    return_code=None,
-    run=None,
+    start_from=1,
+    portfolio=PORTFOLIO,
+    region_margin=None,
+    static_map=True,
+    deadline=None,
 ):
-    solved = False
-    step_num = start_from - 1
-    while run.is_set():
-        while step_num <= len(gates):
-            step_num += 1
-            solved = solve_k(
-                grid_len, grid_height, msf_faces, gates, step_num, fname, bandwidth
-            )
-            if solved:
-                example = "".join(fname.split("_")[:-1])
-                if return_code.get(example):
-                    old = return_code[example]
-                    return_code[example] = min(old, step_num)
-                else:
-                    return_code[example] = step_num
-                run.clear()
-    return step_num
-
-
-def to_int(vpool, lit):
-    if lit[0]:
-        return -vpool.id(lit[1:])
-    else:
-        return vpool.id(lit[1:])
+    """Like solve, racing every solver/encoding of portfolio on each step count."""
+    for step_num in range(start_from, len(gates) + 1):
+        solved = solve_k_portfolio(
+            (
+                grid_len,
+                grid_height,
+                msf_faces,
+                alg_qubits,
+                omitted_edges,
+                gates,
+                step_num,
+                fixed_map,
+                bandwidth,
+            ),
+            dict(region_margin=region_margin, static_map=static_map),
+            portfolio,
+            deadline,
+        )
+        if solved is None:
+            return timed_out()
+        if solved:
+            return interpret_model(solved, gates, step_num)
+    print("no sol")
+    return (-1, "no solution")
 
 
 def writeClause(f, clause):
@@ -533,10 +780,10 @@ def writeClause(f, clause):
     f.write("0\n")
 
 
-def verify(model, grid_len, grid_height, msf_faces, gate_list, k):
+def verify(model, grid_len, grid_height, msf_faces, gate_list, k, static_map=False):
     gate_to_step = {}
-    face_num = (grid_len) * (grid_height)
-    mappable_faces = [p for p in range(face_num) if p not in msf_faces]
+    arch = Architecture(grid_len, grid_height, magic_states=msf_faces)
+    mappable_faces = np.flatnonzero(~arch.is_magic).tolist()
     qubits = extract_qubits(gate_list)
     for q in qubits:
         image = {v for v in model if v[0] == "f" and v[1] == q and v[3] == 0}
@@ -553,6 +800,7 @@ def verify(model, grid_len, grid_height, msf_faces, gate_list, k):
                 executed = True
         assert executed
         if len(gate_list[g]) == 2:
+            map_step = placement_step(gate_to_step[g], static_map)
             path = {
                 v
                 for v in model
@@ -561,13 +809,13 @@ def verify(model, grid_len, grid_height, msf_faces, gate_list, k):
             m_ctrl = {
                 v
                 for v in model
-                if v[0] == "f" and v[1] == gate_list[g][0] and v[3] == gate_to_step[g]
+                if v[0] == "f" and v[1] == gate_list[g][0] and v[3] == map_step
             }
             assert len(m_ctrl) == 1
             m_tar = {
                 v
                 for v in model
-                if v[0] == "f" and v[1] == gate_list[g][1] and v[3] == gate_to_step[g]
+                if v[0] == "f" and v[1] == gate_list[g][1] and v[3] == map_step
             }
             assert len(m_tar) == 1
             edges_only = {(v[1], v[2]) for v in path}
@@ -576,7 +824,7 @@ def verify(model, grid_len, grid_height, msf_faces, gate_list, k):
             p = reachable_from(ctrl, edges_only)
             assert tar in {vertex for edge in p for vertex in edge}
             for u, v in p:
-                assert abs(u - v) == 1 or abs(u - v) == grid_len
+                assert v in arch.neighbors[u]
     deps = edge_list_from_gate_list(gate_list)
     steps = {}
     for key, value in gate_to_step.items():
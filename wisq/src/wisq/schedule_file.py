@@ -0,0 +1,270 @@
+"""
+Compact binary schedule files, written by dump for output paths ending in
+SCHEDULE_SUFFIX instead of indented JSON. Steps are appended one record at a time,
+as they are routed if dump is given an iterator, and read back lazily, so neither
+side needs the whole schedule as Python objects.
+dump also writes a small JSON summary next to every result (SUMMARY_SUFFIX), which
+read_summary answers from without touching the schedule.
+
+Layout, little endian:
+    MAGIC, uint64 header length, header JSON (arch, map, op names)
+    uint64 gate count, then the q0, q1 and op columns of the gates as int32
+    per step: uint32 gate count k, uint32 total path length n, int32 annealing
+    effort (-1 if none), then int32 gate ids[k], path lengths[k] and the
+    concatenated paths[n]
+"""
+
+import json
+import os
+import struct
+import numpy as np
+from .gate_table import OPS, GateTable
+
+MAGIC = b"WISQSCH\x02"
+SCHEDULE_SUFFIX = ".wsch"
+SUMMARY_SUFFIX = ".summary"
+RECORD = struct.Struct("<IIi")
+INT32 = np.dtype("<i4")
+
+
+class ScheduleWriter:
+    """Writes a schedule file step by step, see write_step and summary."""
+
+    def __init__(self, path, arch, map, gates, ops=None):
+        if not isinstance(gates, GateTable):
+            gates = GateTable.from_gates(gates, ops)
+        header = {
+            "arch": arch,
+            "map": [[q, p] for q, p in map],
+            "ops": OPS,
+        }
+        self.gate_num = len(gates)
+        self.t_num = int((gates.q1 < 0).sum())
+        self.map_size = len(header["map"])
+        self.path_lengths = []
+        self.annealing = []
+        header = json.dumps(header).encode()
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        self.file.write(struct.pack("<Q", len(gates)))
+        for column in (gates.q0, gates.q1, gates.op):
+            self.file.write(column.astype(INT32).tobytes())
+
+    def write_step(self, step, effort=None):
+        """
+        Append one step, a list of (gate id, qubits, path) as routed, with the
+        routing orders tried for it (see sim_anneal_route) if any.
+        """
+        ids = [id for id, _, _ in step]
+        lengths = [len(path) for _, _, path in step]
+        paths = [v for _, _, path in step for v in path]
+        effort = -1 if effort is None else effort
+        self.file.write(RECORD.pack(len(ids), len(paths), effort))
+        self.file.write(np.array(ids + lengths + paths, dtype=INT32).tobytes())
+        self.path_lengths.append(len(paths))
+        if effort >= 0:
+            self.annealing.append(effort)
+
+    def summary(self, metadata=None):
+        """See summarize, of the steps written so far."""
+        return summary_of(
+            self.gate_num,
+            self.t_num,
+            self.map_size,
+            self.path_lengths,
+            self.annealing or None,
+            metadata,
+        )
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScheduleReader:
+    """
+    Lazy view of a schedule file. The header and gate columns are read on open.
+    Iterating streams the steps from the file; indexing, len and annealing memory
+    map the step records and index their offsets on first use. Steps come out
+    labeled like the "steps" of the JSON output ({"id", "op", "qubits", "path"} per
+    gate).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a schedule file: {path}")
+            (length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length))
+            (gate_num,) = struct.unpack("<Q", f.read(8))
+            self.q0, self.q1, self.op = (
+                np.fromfile(f, dtype=INT32, count=gate_num) for _ in range(3)
+            )
+            self.steps_start = f.tell()
+        self.arch = header["arch"]
+        self.map = {q: p for q, p in header["map"]}
+        self.op_names = header["ops"]
+        self.offsets = None
+        self.records = None
+        self.path_lengths = None
+        self.efforts = None
+
+    @property
+    def gates(self):
+        return GateTable(self.q0, self.q1, self.op)
+
+    def labeled(self, ids, lengths, paths):
+        paths = paths.tolist()
+        step = []
+        start = 0
+        for id, length, a, b, op in zip(
+            ids.tolist(),
+            lengths.tolist(),
+            self.q0[ids].tolist(),
+            self.q1[ids].tolist(),
+            self.op[ids].tolist(),
+        ):
+            step.append(
+                {
+                    "id": id,
+                    "op": self.op_names[op],
+                    "qubits": [a] if b < 0 else [a, b],
+                    "path": paths[start : start + length],
+                }
+            )
+            start += length
+        return step
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            f.seek(self.steps_start)
+            while record := f.read(RECORD.size):
+                k, n, _ = RECORD.unpack(record)
+                data = np.fromfile(f, dtype=INT32, count=2 * k + n)
+                yield self.labeled(data[:k], data[k : 2 * k], data[2 * k :])
+
+    def index(self):
+        if self.offsets is None:
+            self.records = np.memmap(self.path, dtype=np.uint8, mode="r")
+            self.offsets = []
+            self.path_lengths = []
+            self.efforts = []
+            offset = self.steps_start
+            while offset < len(self.records):
+                self.offsets.append(offset)
+                k, n, effort = RECORD.unpack_from(self.records, offset)
+                self.path_lengths.append(n)
+                self.efforts.append(effort)
+                offset += RECORD.size + 4 * (2 * k + n)
+        return self.offsets
+
+    @property
+    def annealing(self):
+        """Routing orders tried per step, None if the schedule has no such record."""
+        self.index()
+        if not self.efforts or min(self.efforts) < 0:
+            return None
+        return self.efforts
+
+    def step_arrays(self, k):
+        """Gate ids, path lengths and concatenated paths of step k, memory mapped."""
+        offset = self.index()[k]
+        gates, total, _ = RECORD.unpack_from(self.records, offset)
+        data = self.records[offset + RECORD.size :][: 4 * (2 * gates + total)]
+        data = data.view(INT32)
+        return data[:gates], data[gates : 2 * gates], data[2 * gates :]
+
+    def __len__(self):
+        return len(self.index())
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[i] for i in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        return self.labeled(*self.step_arrays(k))
+
+    def summary(self):
+        """See summarize; only the step record headers are read."""
+        self.index()
+        return summary_of(
+            len(self.q0),
+            int((self.q1 < 0).sum()),
+            len(self.map),
+            self.path_lengths,
+            self.annealing,
+        )
+
+    def to_dict(self):
+        """The same dictionary as the JSON output of dump."""
+        output = {"map": self.map, "steps": list(self)}
+        if self.annealing is not None:
+            output["annealing"] = self.annealing
+        output["arch"] = self.arch
+        output["gates"] = [
+            (a,) if b < 0 else (a, b) for a, b in zip(self.q0.tolist(), self.q1.tolist())
+        ]
+        return output
+
+
+def summary_of(gate_num, t_num, map_size, path_lengths, annealing=None, metadata=None):
+    summary = {
+        "steps": len(path_lengths),
+        "gates": gate_num,
+        "t_gates": t_num,
+        "map_size": map_size,
+        "path_length": sum(path_lengths),
+        "max_step_path_length": max(path_lengths, default=0),
+    }
+    if annealing is not None:
+        summary["greedy_steps"] = annealing.count(0)
+    if metadata is not None:
+        summary["metadata"] = metadata
+    return summary
+
+
+def summarize(map, steps, gates, annealing=None, metadata=None):
+    """
+    Summary of a schedule: step, gate and T gate counts, map size, the total routed
+    path length and the largest of any step (its ancilla footprint), the steps
+    routed greedily (see sim_anneal_route) and the run metadata given to dump.
+    """
+    if isinstance(gates, GateTable):
+        t_num = int((gates.q1 < 0).sum())
+    else:
+        t_num = sum(len(gate) == 1 for gate in gates)
+    path_lengths = [sum(len(path) for _, _, path in step) for step in steps]
+    return summary_of(len(gates), t_num, len(map), path_lengths, annealing, metadata)
+
+
+def write_summary(output_path, summary):
+    with open(output_path + SUMMARY_SUFFIX, "w") as f:
+        json.dump(summary, f)
+
+
+def read_summary(path):
+    """
+    Summary of the result file at path, JSON or schedule file: from its summary file
+    if that is at least as new, else computed from the result (for schedule files
+    from the step record headers only). Results without a schedule, e.g. the
+    "timeout" of older runs, give {"steps": <what the file has>}.
+    """
+    sidecar = path + SUMMARY_SUFFIX
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        with open(sidecar) as f:
+            return json.load(f)
+    if path.endswith(SCHEDULE_SUFFIX):
+        return ScheduleReader(path).summary()
+    with open(path) as f:
+        data = json.load(f)
+    steps = data.get("steps")
+    if not isinstance(steps, list):
+        return {"steps": steps}
+    steps = [[(g["id"], g["qubits"], g["path"]) for g in step] for step in steps]
+    return summarize(data["map"], steps, data.get("gates", []), data.get("annealing"))
@@ -0,0 +1,676 @@
+"""
+CNF construction shared by the SAT based SCMR solvers (sat_scmr and
+optimal_arb_layout). Variable IDs are computed in closed form from the block
+offsets of a VarLayout, and the clauses of every per-step constraint family are
+written once as a StepTemplate and stamped out for each step as NumPy int32
+arrays, which reach the solver in bulk through append_formula.
+"""
+
+from bisect import bisect_right
+import numpy as np
+from pysat.card import *
+from .architecture import Architecture
+from .gate_table import GateTable
+
+# exactly-one and at-most-one constraints up to this many literals (a face has at
+# most four neighbors) are encoded pairwise, without auxiliary variables
+PAIRWISE_MAX = 4
+
+
+class VarLayout:
+    """
+    IDs of the semantic variables of the encoding:
+        e(g, k)        gate g is executed in step k
+        b(n, g, k)     face n is part of the braid of gate g in step k
+        l(u, v, g, k)  the braid of gate g in step k uses the link u -> v
+        f(q, p, k)     logical qubit q is placed on face p in step k
+        o(p, k)        some qubit is placed on face p in step k
+        p(g, k)        gate g was executed in one of the steps before k
+        a(k)           every gate was executed before step k
+    Every step k owns one contiguous block holding, gate after gate, e(g, k) and the
+    b and l variables of the faces and links gate g may use (see gate_links),
+    followed by p(g, k + 1) and a(k + 1). Every placement step owns a block of f and
+    o variables. Blocks are allocated from pool as steps are added, and pool also
+    hands out the auxiliary variables of cardinality constraints, so IDs stay dense.
+    Every ID is its block base plus an offset: gate_offset[g] for e, then
+    face_index[g, n] for b and edge_index[g, u, direction(u, v)] for l, and
+    q * face_num + p for f. The accessors take scalars or index arrays. obj and
+    decode map IDs back to (name, index...) tuples, and top mirrors IDPool.
+    """
+
+    def __init__(self, links, face_num, log_num, static_map=False, fixed_map=None):
+        self.face_num = face_num
+        self.gate_num = len(links)
+        self.static_map = static_map
+        # qubits of fixed_map that appear in no gate still get placement variables
+        self.qubit_num = max([log_num] + [q + 1 for q in fixed_map or {}])
+        self.pool = IDPool()
+        self.blocks = []
+        self.starts = []
+        self.templates = None
+        self.gate_offset = np.zeros(self.gate_num, dtype=np.int32)
+        self.face_index = np.full((self.gate_num, face_num), -1, dtype=np.int32)
+        self.edge_index = np.full((self.gate_num, face_num, 4), -1, dtype=np.int32)
+        # faces and links of every gate in block order, for decoding
+        self.faces = []
+        self.edges = []
+        size = 0
+        for g, (outs, ins) in enumerate(links):
+            faces = sorted(outs.keys() | ins.keys())
+            edges = [(u, v) for u in sorted(outs) for v in outs[u]]
+            self.gate_offset[g] = size
+            self.face_index[g, faces] = size + 1 + np.arange(len(faces))
+            if edges:
+                u, v = np.array(edges).T
+                self.edge_index[g, u, direction(u, v)] = (
+                    size + 1 + len(faces) + np.arange(len(edges))
+                )
+            self.faces.append(faces)
+            self.edges.append(edges)
+            size += 1 + len(faces) + len(edges)
+        self.gates_size = size
+        self.p_first = self.allocate(self.gate_num, "p", 0)
+        self.place_size = (self.qubit_num + 1) * face_num
+        self.place_base = [self.allocate(self.place_size, "f", 0)]
+        self.step_base = []
+
+    def allocate(self, size, kind, k):
+        base = self.pool.top + 1
+        self.pool.top += size
+        self.blocks.append((base, size, kind, k))
+        self.starts.append(base)
+        return base
+
+    def extend(self, step_num):
+        """Allocate the blocks of steps len(step_base)..step_num-1."""
+        for k in range(len(self.step_base), step_num):
+            if k > 0 and not self.static_map:
+                self.place_base.append(self.allocate(self.place_size, "f", k))
+            self.step_base.append(
+                self.allocate(self.gates_size + self.gate_num + 1, "e", k)
+            )
+
+    @property
+    def top(self):
+        return self.pool.top
+
+    def e(self, g, k):
+        return self.step_base[k] + self.gate_offset[g]
+
+    def b(self, n, g, k):
+        return self.step_base[k] + self.face_index[g, n]
+
+    def l(self, u, v, g, k):
+        return self.step_base[k] + self.edge_index[g, u, direction(u, v)]
+
+    def f(self, q, p, k):
+        return self.place_base[k] + q * self.face_num + p
+
+    def o(self, p, k):
+        return self.place_base[k] + self.qubit_num * self.face_num + p
+
+    def p(self, g, k):
+        if k == 0:
+            return self.p_first + g
+        return self.step_base[k - 1] + self.gates_size + g
+
+    def a(self, k):
+        return self.step_base[k - 1] + self.gates_size + self.gate_num
+
+    def obj(self, vid):
+        """The (name, index...) tuple of a semantic variable, None for anything else."""
+        i = bisect_right(self.starts, vid) - 1
+        if vid <= 0 or i < 0:
+            return None
+        base, size, kind, k = self.blocks[i]
+        offset = vid - base
+        if offset >= size:
+            return None
+        if kind == "p":
+            return ("p", offset, 0)
+        if kind == "f":
+            if offset < self.qubit_num * self.face_num:
+                return ("f", *divmod(offset, self.face_num), k)
+            return ("o", offset - self.qubit_num * self.face_num, k)
+        if offset >= self.gates_size:
+            offset -= self.gates_size
+            if offset < self.gate_num:
+                return ("p", offset, k + 1)
+            return ("a", k + 1)
+        g = bisect_right(self.gate_offset, offset) - 1
+        offset -= int(self.gate_offset[g]) + 1
+        if offset < 0:
+            return ("e", g, k)
+        if offset < len(self.faces[g]):
+            return ("b", self.faces[g][offset], g, k)
+        return ("l", *self.edges[g][offset - len(self.faces[g])], g, k)
+
+    def decode(self, model):
+        """Tuples of the semantic variables a model (list of literals) sets true."""
+        lits = np.asarray(model)
+        lits = lits[lits > 0]
+        starts = np.array(self.starts)
+        ends = starts + np.array([size for _, size, _, _ in self.blocks])
+        i = np.searchsorted(starts, lits, side="right") - 1
+        semantic = (i >= 0) & (lits < ends[np.maximum(i, 0)])
+        return [self.obj(vid) for vid in lits[semantic].tolist()]
+
+    def items(self):
+        """(id, tuple) of every semantic variable."""
+        for base, size, _, _ in self.blocks:
+            for vid in range(base, base + size):
+                yield vid, self.obj(vid)
+
+
+def direction(u, v):
+    """Index 0-3 of the link u -> v among the links leaving u (left/right/up/down)."""
+    d = v - u
+    return (d > 0) + 2 * (abs(d) != 1)
+
+
+def add_clauses(s, clauses):
+    """Add the rows of an int array to the clause sink s in one append_formula call."""
+    if len(clauses):
+        s.append_formula(clauses.tolist())
+
+
+def instantiate(template, step_base, place_base):
+    """
+    The clauses of a template array (one packed clause per row, see StepTemplate)
+    for every step with the given step and placement block bases, step after step.
+    """
+    packed = np.abs(template) - 1
+    base = np.where(packed & 1, place_base[:, None, None], step_base[:, None, None])
+    lits = np.sign(template) * (base + (packed >> 1))
+    return lits.reshape(len(step_base) * len(template), template.shape[1])
+
+
+class StepTemplate:
+    """
+    The clauses a constraint family adds in every step, written once in terms of
+    block offsets of a VarLayout and instantiated for any range of steps with
+    NumPy. A template literal is +-(2 * offset + 1) for the variable at offset in
+    the step block and +-(2 * offset + 2) for one in the placement block; e, b, l,
+    f and o mirror VarLayout without the step argument. Cardinality constraints
+    over more than PAIRWISE_MAX literals need fresh auxiliary variables in every
+    step, so they are kept aside and go through CardEnc step by step.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.clauses = {}
+        self.cards = []
+        self.arrays = None
+
+    def e(self, g):
+        return 2 * int(self.layout.gate_offset[g]) + 1
+
+    def b(self, n, g):
+        return 2 * int(self.layout.face_index[g, n]) + 1
+
+    def l(self, u, v, g):
+        return 2 * int(self.layout.edge_index[g, u, direction(u, v)]) + 1
+
+    def f(self, q, p):
+        return 2 * (q * self.layout.face_num + p) + 2
+
+    def o(self, p):
+        return 2 * (self.layout.qubit_num * self.layout.face_num + p) + 2
+
+    def add_clause(self, clause):
+        self.clauses.setdefault(len(clause), []).append(clause)
+
+    def add_atmost(self, lits, bound, guard=[]):
+        """At most bound of lits unless one of the guard literals holds."""
+        if bound == 1 and len(lits) <= PAIRWISE_MAX:
+            for i in range(len(lits)):
+                for j in range(i + 1, len(lits)):
+                    self.add_clause([-lits[i], -lits[j]] + guard)
+        elif bound < len(lits):
+            self.cards.append((lits, bound, guard, CardEnc.atmost))
+
+    def add_exactly_one(self, lits, guard=[]):
+        """Exactly one of lits unless one of the guard literals holds."""
+        if len(lits) <= PAIRWISE_MAX:
+            self.add_clause(lits + guard)
+            self.add_atmost(lits, 1, guard)
+        else:
+            self.cards.append((lits, 1, guard, CardEnc.equals))
+
+    def emit(self, s, steps, aux_vars, card_enc=EncType.seqcounter):
+        """Add the clauses of the template for every step k in steps to s."""
+        layout = self.layout
+        steps = list(steps)
+        if not steps:
+            return
+        if self.arrays is None:
+            self.arrays = [np.array(c, dtype=np.int32) for c in self.clauses.values()]
+        step_base = np.array([layout.step_base[k] for k in steps], dtype=np.int32)
+        place_base = np.array(
+            [layout.place_base[placement_step(k, layout.static_map)] for k in steps],
+            dtype=np.int32,
+        )
+        for template in self.arrays:
+            add_clauses(s, instantiate(template, step_base, place_base))
+        for lits, bound, guard, encode in self.cards:
+            template = np.array([lits + guard], dtype=np.int32)
+            stamped = instantiate(template, step_base, place_base).tolist()
+            for clause in stamped:
+                lits_k, guard_k = clause[: len(lits)], clause[len(lits) :]
+                for c in encode(
+                    lits_k, bound, vpool=aux_vars, encoding=card_enc
+                ).clauses:
+                    s.add_clause(c + guard_k)
+
+
+def gate_has_time_step(
+    gate_num, step_num, sem_vars, aux_vars, s, card_enc=EncType.seqcounter
+):
+    step_base = np.array(sem_vars.step_base[:step_num])
+    for i in range(gate_num):
+        lits = (step_base + sem_vars.gate_offset[i]).tolist()
+        equals = CardEnc.equals(lits=lits, bound=1, vpool=aux_vars, encoding=card_enc)
+        s.append_formula(equals.clauses)
+
+
+# incremental counterpart of gate_has_time_step: p(g, k) holds iff gate g was
+# executed in one of the steps before k, and a gate can only be executed once
+def gate_executed_once(gate_num, step_num, sem_vars, s, first_step=0):
+    g = np.arange(gate_num, dtype=np.int32)
+    if first_step == 0:
+        add_clauses(s, -sem_vars.p(g, 0)[:, None])
+    for k in range(first_step, step_num):
+        executed = sem_vars.e(g, k)
+        before = sem_vars.p(g, k)
+        after = sem_vars.p(g, k + 1)
+        add_clauses(s, np.column_stack([-executed, -before]))
+        add_clauses(s, np.column_stack([-after, before, executed]))
+        add_clauses(s, np.column_stack([after, -before]))
+        add_clauses(s, np.column_stack([after, -executed]))
+
+
+# assumption literal a(k) requires every gate to be executed before step k
+def all_executed_by(gate_num, k, sem_vars, s):
+    assumption = sem_vars.a(k)
+    p = sem_vars.p(np.arange(gate_num, dtype=np.int32), k)
+    add_clauses(s, np.column_stack([np.full_like(p, -assumption), p]))
+    return assumption
+
+
+# with a static map one set of placement variables (those of step 0) serves every step
+def placement_step(k, static_map):
+    return 0 if static_map else k
+
+
+def placement_steps(first_step, step_num, static_map):
+    """Steps among first_step..step_num-1 that have placement variables of their own."""
+    if static_map:
+        return range(first_step, min(step_num, 1))
+    return range(first_step, step_num)
+
+
+def maps_are_injective(face_num, log_num, alg_qubits, t):
+    alg = set(alg_qubits)
+    for i in range(log_num):
+        t.add_exactly_one([t.f(i, p) for p in alg_qubits])
+        for j in range(face_num):
+            if j not in alg:
+                t.add_clause([-t.f(i, j)])
+    for j in alg_qubits:
+        t.add_atmost([t.f(q, j) for q in range(log_num)], 1)
+
+
+def map_is_given(map_dict, sem_vars, s):
+    q, p = np.array(list(map_dict.items()), dtype=np.int32).reshape(-1, 2).T
+    add_clauses(s, sem_vars.f(q, p, 0)[:, None])
+
+
+# a face holding a data qubit can end a braid but not be passed through;
+# o(f, k) is implied by any qubit being placed on face f at step k
+def data_preserved(log_num, alg_qubits, links, t, placement):
+    for f in alg_qubits:
+        for q in range(log_num):
+            placement.add_clause([-placement.f(q, f), placement.o(f)])
+        for g, (outs, ins) in enumerate(links):
+            for u in outs.get(f, []):
+                for v in ins.get(f, []):
+                    t.add_clause([-t.l(f, u, g), -t.l(v, f, g), -t.o(f)])
+
+
+# this just imposes a fixed mapping for now
+def swap_effect_constraint(face_num, log_num, step_num, sem_vars, s, first_step=0):
+    i, j, j2 = np.meshgrid(
+        np.arange(log_num), np.arange(face_num), np.arange(face_num), indexing="ij"
+    )
+    moved = j != j2
+    i, j, j2 = i[moved], j[moved], j2[moved]
+    for k in range(max(first_step - 1, 0), step_num - 1):
+        add_clauses(
+            s,
+            np.column_stack([-sem_vars.f(i, j, k), -sem_vars.f(i, j2, k + 1)]),
+        )
+
+
+# def swap_effect_constraint(grid_len, grid_height, gate_num, log_num, step_num, node_num):
+#     clauses = []
+#     face_num = grid_len * grid_height
+#     for k in range(step_num-1):
+#         for i in range(log_num):
+#             for j in range(face_num):
+#                     clause = [(True, 'f', i, j, k),(False, 'f', i, j, k+1)]
+#                     flattened_clause = [flattenedIndex(lit,  gate_num, log_num, step_num, node_num) for lit in clause]
+#                     clauses.append(flattened_clause)
+#     return clauses
+
+
+def dependencies_respected(edge_list, step_num, sem_vars, s, first_step=0):
+    if not edge_list:
+        return
+    before, after = np.array(edge_list, dtype=np.int32).T
+    for k in range(first_step, step_num):
+        earlier = [sem_vars.e(before, k1) for k1 in range(k)]
+        add_clauses(s, np.column_stack([-sem_vars.e(after, k)] + earlier))
+
+
+def braids_nonintersecting(face_num, links, t):
+    users = [[] for _ in range(face_num)]
+    for g, (outs, ins) in enumerate(links):
+        for n in outs.keys() | ins.keys():
+            users[n].append(g)
+    for n in range(face_num):
+        t.add_atmost([t.b(n, g) for g in users[n]], 1)
+
+
+def edges_match_colors(links, t):
+    for g, (outs, ins) in enumerate(links):
+        for j, targets in outs.items():
+            for n in targets:
+                link = t.l(j, n, g)
+                t.add_clause([t.b(j, g), -link])
+                t.add_clause([t.b(n, g), -link])
+                if j < n and j in outs.get(n, []):
+                    t.add_clause([-link, -t.l(n, j, g)])
+
+
+def path_control_target(grid_len, links, gate_list, msf_faces, alg_qubits, t):
+    alg = set(alg_qubits)
+    for g in range(len(gate_list)):
+        outs, ins = links[g]
+        faces = outs.keys() | ins.keys()
+        not_executed = -t.e(g)
+        if len(gate_list[g]) == 2:
+            c, tgt = gate_list[g]
+            for j in alg_qubits:
+                lits_1 = [
+                    t.l(n, j, g)
+                    for n in ins.get(j, [])
+                    if n // grid_len == j // grid_len
+                ]
+                t.add_exactly_one(lits_1, [not_executed, -t.f(tgt, j)])
+                lits_1_ctrl = [
+                    t.l(j, n, g)
+                    for n in outs.get(j, [])
+                    if n // grid_len != j // grid_len
+                ]
+                t.add_exactly_one(lits_1_ctrl, [not_executed, -t.f(c, j)])
+                for n in outs.get(j, []):
+                    t.add_clause([-t.l(j, n, g), -t.f(tgt, j)])
+            for j in faces:
+                lits_in = [t.l(n, j, g) for n in ins.get(j, [])]
+                lits_out = [t.l(j, n, g) for n in outs.get(j, [])]
+                colored = -t.b(j, g)
+                if j in alg:
+                    t.add_exactly_one(lits_in, [colored, t.f(c, j)])
+                    t.add_exactly_one(lits_out, [colored, t.f(tgt, j)])
+                else:
+                    t.add_exactly_one(lits_in, [colored])
+                    t.add_exactly_one(lits_out, [colored])
+        else:
+            tgt = gate_list[g][0]
+            for j in alg_qubits:
+                lits_1 = [
+                    t.l(j, n, g)
+                    for n in outs.get(j, [])
+                    if n // grid_len != j // grid_len
+                ]
+                t.add_exactly_one(lits_1, [not_executed, -t.f(tgt, j)])
+            # the braid ends in exactly one magic state face, entered horizontally
+            lits_1_msf = [
+                t.l(n, m, g)
+                for m in msf_faces
+                for n in ins.get(m, [])
+                if n // grid_len == m // grid_len
+            ]
+            t.add_exactly_one(lits_1_msf, [not_executed])
+            for j in faces:
+                lits_in = [t.l(n, j, g) for n in ins.get(j, [])]
+                colored = -t.b(j, g)
+                if j in alg:
+                    t.add_exactly_one(lits_in, [colored, t.f(tgt, j)])
+                else:
+                    t.add_exactly_one(lits_in, [colored])
+                if j not in msf_faces:
+                    lits_out = [t.l(j, n, g) for n in outs.get(j, [])]
+                    t.add_exactly_one(lits_out, [colored])
+
+
+def bandwidth_constraint(gate_list, bandwidth, t):
+    if bandwidth:
+        t_indices = [i for i in range(len(gate_list)) if len(gate_list[i]) == 1]
+        t.add_atmost([t.e(i) for i in t_indices], bandwidth)
+
+
+def gate_links(
+    grid_len,
+    grid_height,
+    omitted_edges,
+    gate_list,
+    msf_faces,
+    fixed_map=None,
+    region_margin=None,
+):
+    """
+    Directed grid edges the braid of each gate may use, as an (outs, ins) pair of
+    face -> neighbor lists per gate; only these edges get link variables. No braid
+    leaves a magic state face and only T braids enter one, from a horizontal neighbor.
+    With a fixed_map, braids avoid the faces of other qubits and never enter their
+    own control (or T target) or leave their own target. region_margin further
+    confines each braid to the bounding box of its endpoints and the faces it leaves
+    and enters them through (for T gates, the free horizontal neighbors of the
+    nearest magic state that has one) grown by that many faces, which may cut off
+    optimal detours.
+    """
+    arch = Architecture(
+        grid_len, grid_height, magic_states=msf_faces, omitted_edges=omitted_edges
+    )
+    is_magic = arch.is_magic.tolist()
+    x, y = arch.x.tolist(), arch.y.tolist()
+    fixed_map = fixed_map or {}
+    occupant = {p: q for q, p in fixed_map.items()}
+    nearest_msf = None
+    if fixed_map and region_margin is not None:
+        nearest_msf = arch.nearest_msf
+    links = []
+    for gate in gate_list:
+        # faces the braid may not enter / leave
+        no_in = {fixed_map[gate[0]]} if gate[0] in fixed_map else set()
+        no_out = set()
+        if len(gate) == 2 and gate[1] in fixed_map:
+            no_out.add(fixed_map[gate[1]])
+        region = None
+        if nearest_msf is not None and all(q in fixed_map for q in gate):
+            # braids leave the control vertically and enter the target horizontally
+            control = fixed_map[gate[0]]
+            ends = [control, *arch.vertical[control]]
+            if len(gate) == 2:
+                target = fixed_map[gate[1]]
+                ends += [target, *arch.horizontal[target]]
+            else:
+                # the nearest magic state with a free face to enter it from
+                for m in nearest_msf[control]:
+                    entries = [p for p in arch.horizontal[m] if p not in occupant]
+                    if entries:
+                        ends += entries
+                        break
+            xs = [x[p] for p in ends]
+            ys = [y[p] for p in ends]
+            region = (
+                min(xs) - region_margin,
+                max(xs) + region_margin,
+                min(ys) - region_margin,
+                max(ys) + region_margin,
+            )
+
+        def usable(p):
+            if p in occupant and occupant[p] not in gate:
+                return False
+            if region is None or is_magic[p]:
+                return True
+            return region[0] <= x[p] <= region[1] and region[2] <= y[p] <= region[3]
+
+        outs = {}
+        ins = {}
+        for u in range(arch.size):
+            if is_magic[u] or u in no_out or not usable(u):
+                continue
+            for v in arch.neighbors[u]:
+                if v in no_in or not usable(v):
+                    continue
+                if is_magic[v] and (len(gate) == 2 or u not in arch.horizontal[v]):
+                    continue
+                outs.setdefault(u, []).append(v)
+                ins.setdefault(v, []).append(u)
+        links.append((outs, ins))
+    return links
+
+
+def edge_list_from_gate_list(gate_list):
+    if isinstance(gate_list, GateTable):
+        return gate_list.edges()
+    edge_list = []
+    qubit_depth = {}
+    for i in range(len(gate_list)):
+        for qubit in gate_list[i]:
+            if qubit in qubit_depth:
+                edge_list.append((qubit_depth[qubit], i))
+            qubit_depth[qubit] = i
+    return edge_list
+
+
+def extract_qubits(gate_list):
+    qubits = set()
+    for gate in gate_list:
+        for qubit in gate:
+            qubits.add(qubit)
+    return qubits
+
+
+def encode_steps(
+    grid_len,
+    grid_height,
+    msf_faces,
+    alg_qubits,
+    omitted_edges,
+    gate_list,
+    edge_list,
+    links,
+    first_step,
+    step_num,
+    bandwidth,
+    sem_vars,
+    aux_vars,
+    s,
+    static_map=False,
+    log_num=None,
+    card_enc=EncType.seqcounter,
+):
+    """
+    Add the clauses of every per-step constraint family for steps
+    first_step..step_num-1, allocating their variables in the VarLayout sem_vars.
+    The step and placement templates are built on the first call and kept in
+    sem_vars. Magic state faces have no outgoing edges in links. With static_map
+    the placement of step 0 is used throughout and swap_effect_constraint (which
+    would only tie identical per-step placements together) is dropped. log_num
+    overrides the number of logical qubits to place (qubits 0..log_num-1).
+    card_enc is the pysat EncType used for cardinality constraints too large to
+    encode pairwise.
+    """
+    face_num = grid_len * grid_height
+    if log_num is None:
+        log_num = len(extract_qubits(gate_list))
+    sem_vars.extend(step_num)
+    if sem_vars.templates is None:
+        step = StepTemplate(sem_vars)
+        placement = StepTemplate(sem_vars)
+        maps_are_injective(face_num, log_num, alg_qubits, placement)
+        data_preserved(log_num, alg_qubits, links, step, placement)
+        braids_nonintersecting(face_num, links, step)
+        path_control_target(grid_len, links, gate_list, msf_faces, alg_qubits, step)
+        bandwidth_constraint(gate_list, bandwidth, step)
+        edges_match_colors(links, step)
+        sem_vars.templates = step, placement
+    step, placement = sem_vars.templates
+    placement.emit(
+        s, placement_steps(first_step, step_num, static_map), aux_vars, card_enc
+    )
+    step.emit(s, range(first_step, step_num), aux_vars, card_enc)
+    dependencies_respected(edge_list, step_num, sem_vars, s, first_step)
+    if not static_map:
+        swap_effect_constraint(face_num, log_num, step_num, sem_vars, s, first_step)
+
+
+def encode_k(
+    grid_len,
+    grid_height,
+    msf_faces,
+    alg_qubits,
+    omitted_edges,
+    gate_list,
+    step_num,
+    fixed_map,
+    bandwidth,
+    s,
+    region_margin=None,
+    static_map=True,
+    card_enc=EncType.seqcounter,
+):
+    """
+    Add the CNF for step_num steps to the clause sink s, a pysat Solver or a
+    DimacsWriter, and return its VarLayout.
+    """
+    gate_num = len(gate_list)
+    log_num = len(extract_qubits(gate_list))
+    edge_list = edge_list_from_gate_list(gate_list)
+    links = gate_links(
+        grid_len,
+        grid_height,
+        omitted_edges,
+        gate_list,
+        msf_faces,
+        fixed_map,
+        region_margin,
+    )
+    vpool = VarLayout(links, grid_len * grid_height, log_num, static_map, fixed_map)
+    vpool.extend(step_num)
+    gate_has_time_step(gate_num, step_num, vpool, vpool.pool, s, card_enc)
+    if fixed_map:
+        map_is_given(fixed_map, vpool, s)
+    encode_steps(
+        grid_len,
+        grid_height,
+        msf_faces,
+        alg_qubits,
+        omitted_edges,
+        gate_list,
+        edge_list,
+        links,
+        0,
+        step_num,
+        bandwidth,
+        vpool,
+        vpool.pool,
+        s,
+        static_map,
+        card_enc=card_enc,
+    )
+    return vpool
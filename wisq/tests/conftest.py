@@ -0,0 +1,14 @@
+import pytest
+from wisq.architecture import compact_layout
+
+
+@pytest.fixture
+def gates():
+    """A small circuit of CNOTs and T gates on four qubits."""
+    return [(0, 1), (2, 3), (0,), (1, 2), (3,), (0, 3), (1,), (2, 0)]
+
+
+@pytest.fixture
+def compact_arch():
+    """A compact layout for four qubits with magic state factories on all sides."""
+    return compact_layout(4, magic_states="all_sides")
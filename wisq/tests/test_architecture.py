@@ -0,0 +1,36 @@
+import numpy as np
+from wisq.architecture import (
+    Architecture,
+    compact_layout,
+    horizontal_neighbors,
+    nearest_magic_states,
+    vertical_neighbors,
+)
+
+
+def test_architecture_matches_layout_dict():
+    layout = compact_layout(6, magic_states="all_sides")
+    arch = Architecture.from_dict(layout)
+    assert arch.to_dict() == {key: layout[key] for key in Architecture.KEYS}
+    assert arch["width"] == layout["width"]
+    width, height = layout["width"], layout["height"]
+    for n in range(width * height):
+        assert arch.coords(n) == (arch.x[n], arch.y[n]) == (n % width, n // width)
+        assert list(arch.horizontal[n]) == horizontal_neighbors(n, width, height, [])
+        assert list(arch.vertical[n]) == vertical_neighbors(n, width, height, [])
+        assert arch.is_data[n] == (n in layout["alg_qubits"])
+        assert arch.is_magic[n] == (n in layout["magic_states"])
+        assert arch.is_ancilla[n] != (arch.is_data[n] or arch.is_magic[n])
+    assert np.array_equal(
+        arch.nearest_msf, nearest_magic_states(layout["magic_states"], width, height)
+    )
+    assert arch.distance(0, width * height - 1) == width + height - 2
+
+
+def test_distance_with_omitted_edges():
+    # 3x2 grid without the middle vertical edge: 1 -> 4 has to go around
+    arch = Architecture(3, 2, omitted_edges=[(1, 4)])
+    assert 4 not in arch.neighbors[1] and 1 not in arch.neighbors[4]
+    assert arch.distance(1, 4) == 3
+    assert arch.distance(0, 5) == 3
+    assert list(arch.distance(np.array([0, 1]), np.array([3, 2]))) == [1, 1]
@@ -0,0 +1,71 @@
+import random
+import time
+import pytest
+from wisq import dascot, sarouting
+from wisq.architecture import compact_layout
+from wisq.dascot import (
+    dascot_lower_bound,
+    init_route_worker,
+    route_chain,
+    sim_anneal_route_parallel,
+)
+from wisq.sarouting import sim_anneal_route
+from wisq.scmr_encoding import edge_list_from_gate_list
+
+ROUTE_KWARGS = dict(
+    temperature=10, cooling_rate=0.1, termination_temp=0.1, order_fraction=1
+)
+
+
+def assert_valid_schedule(gates, mapping, steps):
+    step_of = {id: k for k, step in enumerate(steps) for id, _, _ in step}
+    assert sorted(step_of) == list(range(len(gates)))
+    assert all(step_of[a] < step_of[b] for a, b in edge_list_from_gate_list(gates))
+    faces = {p for _, p in mapping}
+    for step in steps:
+        used = [v for _, _, path in step for v in path]
+        assert len(used) == len(set(used)) and not faces & set(used)
+
+
+@pytest.mark.parametrize("hbm_arch", ["ARCH_A", "ARCH_B", "ARCH_C", "NO_HBM"])
+def test_dascot_lower_bound_below_routed_steps(monkeypatch, hbm_arch):
+    monkeypatch.setattr(dascot, "HBM_ARCH", hbm_arch)
+    monkeypatch.setattr(sarouting, "HBM_ARCH", hbm_arch)
+    # a wall of factories in column 3 of a 7x7 grid, open in the last row, between
+    # the controls in column 1 and the targets in column 5 of three parallel CNOTs
+    arch = {
+        "width": 7,
+        "height": 7,
+        "alg_qubits": [7 * row + col for row in (1, 3, 5) for col in (1, 5)],
+        "magic_states": [7 * row + 3 for row in range(6)],
+    }
+    mapping = [(i, 7 * row + 1) for i, row in enumerate((1, 3, 5))]
+    mapping += [(i + 3, 7 * row + 5) for i, row in enumerate((1, 3, 5))]
+    gates = [(0, 3), (1, 4), (2, 5)]
+    steps, _ = sim_anneal_route(gates, arch, mapping, 10, 0.1, 0.1, 1)
+    assert dascot_lower_bound(gates, arch, mapping) <= len(steps)
+
+
+def test_parallel_routing_keeps_shortest_chain():
+    rng = random.Random(5)
+    gates = [tuple(rng.sample(range(6), rng.choice([1, 2]))) for _ in range(40)]
+    arch = compact_layout(6, magic_states="all_sides")
+    mapping = list(zip(range(6), arch["alg_qubits"]))
+    random.seed(3)
+    steps, annealing = sim_anneal_route_parallel(
+        gates, arch, mapping, 2, 600, **ROUTE_KWARGS
+    )
+    assert_valid_schedule(gates, mapping, steps)
+    assert len(annealing) == len(steps) and 0 not in annealing
+    # the same chains, run one after the other in this process
+    random.seed(3)
+    seeds = [random.randrange(2**32) for _ in range(2)]
+    init_route_worker(gates, arch, mapping)
+    chains = [route_chain(seed, time.time() + 600, ROUTE_KWARGS) for seed in seeds]
+    assert len(steps) == min(len(chain_steps) for chain_steps, _ in chains)
+    # past the deadline every chain routes greedily
+    steps, annealing = sim_anneal_route_parallel(
+        gates, arch, mapping, 2, 0, **ROUTE_KWARGS
+    )
+    assert_valid_schedule(gates, mapping, steps)
+    assert annealing == [0] * len(steps)
@@ -0,0 +1,26 @@
+import random
+from wisq.gate_table import GateTable
+from wisq.sarouting import build_crit_dict_fast
+from wisq.scmr_encoding import edge_list_from_gate_list
+
+
+def random_gates(num_qubits, num_gates, seed):
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(num_qubits),)
+        if rng.random() < 0.3
+        else tuple(rng.sample(range(num_qubits), 2))
+        for _ in range(num_gates)
+    ]
+
+
+def test_gate_table_matches_gate_list():
+    gates = random_gates(6, 80, seed=0)
+    table = GateTable.from_gates(gates)
+    assert list(table) == gates and table[5] == gates[5] and table[::-1] == gates[::-1]
+    assert build_crit_dict_fast(table) == build_crit_dict_fast(gates)
+    assert edge_list_from_gate_list(table) == edge_list_from_gate_list(gates)
+    # ASAP layers: every gate is one layer after its latest predecessor
+    for id, gate in enumerate(gates):
+        preds = [a for a, b in edge_list_from_gate_list(gates) if b == id]
+        assert table.layer[id] == 1 + max((table.layer[p] for p in preds), default=-1)
@@ -0,0 +1,20 @@
+from wisq.architecture import compact_layout
+from wisq.lower_bounds import magic_state_bound, step_lower_bound
+from wisq.sat_scmr import solve
+
+
+def test_step_lower_bound_below_sat_optimum(gates, compact_arch):
+    arch = compact_arch
+    mapping, steps = solve(
+        gates, arch["magic_states"], arch["alg_qubits"], arch["width"], arch["height"]
+    )
+    assert step_lower_bound(gates, arch) <= len(steps)
+    assert step_lower_bound(gates, arch, dict(mapping)) <= len(steps)
+
+
+def test_magic_state_bound_single_factory():
+    arch = compact_layout(3, magic_states="single_magic_state")
+    # four independent T gates through one factory
+    assert magic_state_bound([(0,), (1,), (0,), (1,)], arch) == 4
+    # the last of them is followed by a chain of two CNOTs
+    assert magic_state_bound([(0,), (1,), (0,), (1,), (0, 1), (0, 1)], arch) == 6
@@ -0,0 +1,63 @@
+import random
+import time
+from qiskit import QuantumCircuit
+from wisq.architecture import square_sparse_layout
+from wisq.phased_graph import (
+    OverlapCost,
+    build_phased_map,
+    build_phased_connectivity_graph_fast,
+    count_overlapping_fast,
+    update_overlaps_fast,
+)
+
+
+def random_circuit(num_qubits, num_gates, seed):
+    rng = random.Random(seed)
+    circ = QuantumCircuit(num_qubits)
+    for _ in range(num_gates):
+        if rng.random() < 0.3:
+            circ.t(rng.randrange(num_qubits))
+        else:
+            circ.cx(*rng.sample(range(num_qubits), 2))
+    return circ
+
+
+def test_overlap_cost_matches_reference():
+    rng = random.Random(0)
+    num_qubits = 9
+    circ = random_circuit(num_qubits, 60, seed=1)
+    arch = square_sparse_layout(num_qubits, magic_states="all_sides")
+    grid_len = arch["width"]
+    phased_graphs = build_phased_connectivity_graph_fast(circ)
+    faces = rng.sample(arch["alg_qubits"], num_qubits)
+    mapping = {q: tuple(reversed(divmod(p, grid_len))) for q, p in enumerate(faces)}
+    cost = OverlapCost(phased_graphs, arch, mapping)
+    assert cost.overlaps == count_overlapping_fast(mapping, phased_graphs, arch)
+    for _ in range(30):
+        qubit1, qubit2 = rng.sample(range(num_qubits), 2)
+        new_mapping = mapping.copy()
+        new_mapping[qubit1], new_mapping[qubit2] = mapping[qubit2], mapping[qubit1]
+        delta, move = cost.swap_delta(qubit1, qubit2)
+        assert delta == update_overlaps_fast(
+            phased_graphs, arch, mapping, new_mapping, qubit1, qubit2
+        )
+        cost.apply(move)
+        mapping = new_mapping
+        assert cost.count() == count_overlapping_fast(mapping, phased_graphs, arch)
+
+
+def test_parallel_tempering_map_is_injective_and_stops_at_timeout():
+    num_qubits = 16
+    circ = random_circuit(num_qubits, 400, seed=2)
+    arch = square_sparse_layout(num_qubits, magic_states="all_sides")
+    start = time.time()
+    # a cooling rate this slow would anneal for far longer than the timeout
+    mapping, overlaps = build_phased_map(
+        range(num_qubits), circ, arch, 100, 1e-9, 0.1, 2, workers=2
+    )
+    assert time.time() - start < 10
+    qubits, faces = zip(*mapping)
+    assert sorted(qubits) == list(range(num_qubits))
+    assert len(set(faces)) == num_qubits
+    assert set(faces) <= set(arch["alg_qubits"])
+    assert overlaps >= 0
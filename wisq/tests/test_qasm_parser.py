@@ -0,0 +1,62 @@
+from qiskit import QuantumCircuit, qasm2
+from qiskit.converters import circuit_to_dag
+from wisq.phased_graph import (
+    build_phased_connectivity_graph_fast,
+    build_phased_connectivity_graph_from_qasm,
+)
+from wisq.qasm_parser import parse_qasm
+
+QASM = """OPENQASM 2.0;
+include "qelib1.inc";
+gate majority a, b, c { cx c, b; cx c, a; ccx a, b, c; }
+qreg q[4];
+qreg anc[2];
+creg c[2];
+h q;
+cx q[0], q[1];
+t q[2]; tdg q[3];
+cx q[1],
+   q[2];  // split over two lines
+rz(pi/4) anc[0];
+majority q[0], q[3], anc[1];
+cz q[3], anc[0];
+barrier q[1], anc;
+cx q[2], anc[1];
+measure q[0] -> c[0];
+measure anc -> c;
+t q[0];
+cx anc[0], q[0];
+"""
+
+
+def test_parse_qasm_matches_qiskit(tmp_path):
+    path = tmp_path / "circuit.qasm"
+    path.write_text(QASM)
+    circ = QuantumCircuit.from_qasm_file(str(path))
+    parsed = parse_qasm(str(path))
+    # anc follows q, and gates inside the majority definition are not counted
+    assert list(parsed.gates) == [(0, 1), (2,), (3,), (1, 2), (2, 5), (0,), (4, 0)]
+    assert parsed.ops == ["cx", "t", "tdg", "cx", "cx", "t", "cx"]
+    assert parsed.num_qubits == circ.num_qubits
+    assert parsed.depth == circ.depth(
+        filter_function=lambda x: x.operation.name in ["cx", "t", "tdg"]
+    )
+    assert parsed.num_layers == circuit_to_dag(circ).depth()
+
+
+def test_phased_graph_from_qasm_matches_dag(tmp_path):
+    # a single register, build_phased_connectivity_graph_fast uses register indices
+    circ = QuantumCircuit(5, 2)
+    for q in range(5):
+        circ.h(q)
+        circ.cx(q, (q + 2) % 5)
+        circ.t((q + 1) % 5)
+    circ.measure([0, 3], [0, 1])
+    circ.barrier(1, 4)
+    circ.tdg(0)
+    circ.cx(4, 2)
+    path = tmp_path / "circuit.qasm"
+    path.write_text(qasm2.dumps(circ))
+    assert build_phased_connectivity_graph_from_qasm(
+        parse_qasm(str(path))
+    ) == build_phased_connectivity_graph_fast(circ)
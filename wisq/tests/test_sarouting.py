@@ -0,0 +1,98 @@
+from wisq.architecture import compact_layout
+from wisq.sarouting import (
+    GateFrontier,
+    RoutingState,
+    build_routing_state,
+    executable_subset,
+    route_gate,
+    sim_anneal_route,
+    try_order,
+    try_order_incremental,
+)
+
+
+def test_routing_state_reserve_release():
+    state = RoutingState(3, 3, blocked=[4])
+    assert state.shortest_path(0, 8) is not None
+    assert state.shortest_path(4, 8) is None
+    state.reserve(1)
+    state.reserve(3)
+    assert state.shortest_path(0, 8) is None
+    state.release(3)
+    assert state.shortest_path(0, 8) == [0, 3, 6, 7, 8]
+    state.reset()
+    assert state.is_free(1) and not state.is_free(4)
+
+
+def test_nearest_path_prefers_closest_then_rank():
+    state = RoutingState(5, 1)
+    # 4 is the best ranked target but 1 is closer to the sources
+    assert state.nearest_path([0, 2], [4, 1]) == [0, 1]
+    assert state.nearest_path([0, 2], [4, 1], first_reachable=True) == [2, 3, 4]
+    state.reserve(3)
+    assert state.nearest_path([0], [4], first_reachable=True) is None
+
+
+def test_route_gate_reserves_path():
+    arch = compact_layout(4, magic_states="all_sides")
+    mapping = dict(zip(range(4), arch["alg_qubits"]))
+    state = build_routing_state(arch, mapping)
+    route = route_gate((0, (0, 1)), state, mapping, False)
+    assert len(route) == 1
+    _, _, path = route[0]
+    assert all(not state.is_free(v) for v in path)
+    # the same gate cannot be routed again through the reserved tiles
+    assert route_gate((1, (0, 1)), state, mapping, False) == []
+
+
+def test_sim_anneal_route_schedules_every_gate():
+    arch = compact_layout(6, magic_states="all_sides")
+    mapping = list(zip(range(6), arch["alg_qubits"]))
+    gates = [(0, 1), (2, 3), (4,), (1, 2), (5,), (0, 5), (3, 4)]
+    steps, _ = sim_anneal_route(
+        gates, arch, mapping, 10, 0.1, 0.1, 1, initial_order="naive"
+    )
+    routed = sorted(id for step in steps for id, _, _ in step)
+    assert routed == list(range(len(gates)))
+
+
+def test_sim_anneal_route_past_deadline_routes_greedily():
+    arch = compact_layout(6, magic_states="all_sides")
+    mapping = list(zip(range(6), arch["alg_qubits"]))
+    gates = [(0, 1), (2, 3), (4,), (1, 2), (5,), (0, 5), (3, 4)]
+    steps, annealing = sim_anneal_route(
+        gates, arch, mapping, 10, 0.1, 0.1, 1, deadline=0
+    )
+    assert annealing == [0] * len(steps)
+    routed = sorted(id for step in steps for id, _, _ in step)
+    assert routed == list(range(len(gates)))
+
+
+def test_incremental_order_matches_full_reroute():
+    arch = compact_layout(8, magic_states="all_sides")
+    mapping = dict(zip(range(8), arch["alg_qubits"]))
+    items = list(enumerate([(0, 1), (2, 3), (4, 5), (6, 7), (1,), (6,)]))
+    state = build_routing_state(arch, mapping)
+    _, trace = try_order_incremental([0, 1, 2, 3, 4, 5], items, state, mapping, False)
+    for order in ([0, 1, 3, 2, 4, 5], [0, 1, 3, 2, 5, 4], [3, 2, 1, 0, 4, 5]):
+        step, trace = try_order_incremental(order, items, state, mapping, False, trace)
+        assert step == try_order(order, items, state, mapping, False)
+
+
+def test_gate_frontier_matches_executable_subset():
+    gates = [(0, 1), (2,), (1, 2), (3, 0), (3,), (2, 3), (1,)]
+    frontier = GateFrontier(gates)
+    table = {i: gate for i, gate in enumerate(gates)}
+    done = set()
+    while frontier.pending:
+        executable, remaining = executable_subset(table)
+        assert frontier.executable() == executable
+        # execute only the first ready gate to exercise leftovers
+        id = next(iter(executable))
+        frontier.execute([id])
+        done.add(id)
+        table = {
+            **{i: g for i, g in executable.items() if i != id},
+            **remaining,
+        }
+    assert done == set(range(len(gates)))
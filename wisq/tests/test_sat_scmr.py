@@ -0,0 +1,192 @@
+import sys
+import time
+import pytest
+from wisq.architecture import square_sparse_layout
+from wisq.sat_scmr import (
+    edge_list_from_gate_list,
+    gate_links,
+    solve,
+    solve_before,
+    solve_k_portfolio,
+    solve_windowed,
+)
+from pysat.card import EncType
+from pysat.examples.genhard import PHP
+from pysat.solvers import Solver
+
+# stand-in for a SAT solver binary, printing SAT competition style output
+FAKE_SOLVER = """
+import sys
+from pysat.formula import CNF
+from pysat.solvers import Solver
+with Solver(bootstrap_with=CNF(from_file=sys.argv[1]).clauses) as s:
+    if s.solve():
+        print("s SATISFIABLE")
+        print("v", *s.get_model(), 0)
+    else:
+        print("s UNSATISFIABLE")
+"""
+
+
+@pytest.fixture
+def solve_on_compact_layout(compact_arch):
+    def solve_on(gates, **kwargs):
+        return solve(
+            gates,
+            compact_arch["magic_states"],
+            compact_arch["alg_qubits"],
+            compact_arch["width"],
+            compact_arch["height"],
+            **kwargs,
+        )
+
+    return solve_on
+
+
+def test_search_modes_agree_on_step_count(gates, solve_on_compact_layout):
+    _, rebuilt = solve_on_compact_layout(gates, search="rebuild")
+    _, incremental = solve_on_compact_layout(gates, search="incremental")
+    _, galloped = solve_on_compact_layout(gates, search="binary")
+    _, bounded = solve_on_compact_layout(gates, search="binary", upper_bound=7)
+    _, per_step_map = solve_on_compact_layout(gates, static_map=False)
+    _, raced = solve_on_compact_layout(
+        gates,
+        search="portfolio",
+        portfolio=[("cd", EncType.totalizer), ("g4", EncType.cardnetwrk)],
+    )
+    assert len(rebuilt) == len(incremental) == len(galloped) == len(bounded)
+    assert len(per_step_map) == len(raced) == len(rebuilt)
+    assert sorted(g[0] for step in bounded for g in step) == list(range(len(gates)))
+
+
+def test_gate_links_only_use_grid_edges(gates, compact_arch):
+    arch = compact_arch
+    width, msf = arch["width"], set(arch["magic_states"])
+    fixed_map = {q: arch["alg_qubits"][q] for q in range(4)}
+    links = gate_links(
+        width, arch["height"], [], gates, arch["magic_states"], fixed_map
+    )
+    for gate, (outs, ins) in zip(gates, links):
+        for u, targets in outs.items():
+            assert u not in msf
+            for v in targets:
+                assert abs(u - v) in (1, width)
+                assert u in ins[v]
+                assert len(gate) == 1 or v not in msf
+                assert v not in msf or abs(u - v) == 1
+                assert v not in fixed_map.values() or v == fixed_map[gate[-1]]
+
+
+def test_region_margin_keeps_fixed_map_solvable(
+    gates, compact_arch, solve_on_compact_layout
+):
+    fixed_map = {q: compact_arch["alg_qubits"][q] for q in range(4)}
+    _, unconfined = solve_on_compact_layout(gates, fixed_map=fixed_map)
+    for margin in (0, 1, 2):
+        _, steps = solve_on_compact_layout(
+            gates, fixed_map=fixed_map, region_margin=margin
+        )
+        assert isinstance(steps, list) and len(steps) >= len(unconfined)
+    # a single CNOT still fits the bounding box of its endpoints
+    _, steps = solve_on_compact_layout(
+        [(0, 1)], fixed_map={0: fixed_map[0], 1: fixed_map[1]}, region_margin=0
+    )
+    assert len(steps) == 1
+
+
+def test_t_braids_enter_magic_states_horizontally():
+    # the only factory sits between the data faces of qubits 0 and 1, so no T braid
+    # can enter it from the side once every data face is taken
+    arch = square_sparse_layout(4, magic_states="single_magic_state")
+    fixed_map = dict(enumerate(arch["alg_qubits"]))
+    assert solve(
+        [(0,)],
+        arch["magic_states"],
+        arch["alg_qubits"],
+        arch["width"],
+        arch["height"],
+        fixed_map=fixed_map,
+    ) == (-1, "no solution")
+    _, steps = solve(
+        [(0,)],
+        arch["magic_states"],
+        arch["alg_qubits"],
+        arch["width"],
+        arch["height"],
+        fixed_map={0: fixed_map[0]},
+    )
+    [(_, _, path)] = steps[0]
+    assert path[-1] == 8
+
+
+def test_portfolio_errors(gates, compact_arch):
+    args = (
+        compact_arch["width"],
+        compact_arch["height"],
+        compact_arch["magic_states"],
+        compact_arch["alg_qubits"],
+        [],
+        gates,
+        len(gates),
+        None,
+        None,
+    )
+    with pytest.raises(ValueError):
+        solve_k_portfolio(args, {}, [])
+    with pytest.raises(RuntimeError):
+        solve_k_portfolio(args, {}, [("no_such_solver", EncType.seqcounter)])
+
+
+def test_windowed_schedule_is_consistent(gates, compact_arch, solve_on_compact_layout):
+    map, steps = solve_windowed(
+        gates,
+        compact_arch["magic_states"],
+        compact_arch["alg_qubits"],
+        compact_arch["width"],
+        compact_arch["height"],
+        window=2,
+        commit=1,
+    )
+    _, optimal = solve_on_compact_layout(gates)
+    assert len(steps) >= len(optimal)
+    step_of = {g[0]: k for k, step in enumerate(steps) for g in step}
+    assert sorted(step_of) == list(range(len(gates)))
+    assert all(step_of[a] < step_of[b] for a, b in edge_list_from_gate_list(gates))
+    faces = set(dict(map).values())
+    for step in steps:
+        used = [f for _, _, path in step for f in path]
+        assert len(used) == len(set(used)) and not faces & set(used)
+
+
+def test_external_solver_round_trip(tmp_path, gates, solve_on_compact_layout):
+    solver = tmp_path / "fake_solver.py"
+    solver.write_text(FAKE_SOLVER)
+    _, expected = solve_on_compact_layout(gates)
+    _, steps = solve_on_compact_layout(
+        gates,
+        search="external",
+        external_solver=f"{sys.executable} {solver}",
+        dimacs_path=str(tmp_path / "scmr.cnf.gz"),
+    )
+    assert len(steps) == len(expected)
+    assert (tmp_path / "scmr.cnf.gz.vars").exists()
+
+
+def test_deadline_gives_anytime_result(gates, solve_on_compact_layout):
+    assert solve_on_compact_layout(gates, deadline=time.time()) == (-1, "timeout")
+    _, expected = solve_on_compact_layout(gates)
+    _, steps = solve_on_compact_layout(gates, deadline=time.time() + 600)
+    assert len(steps) == len(expected)
+    # Glucose can also be interrupted mid-solve
+    _, steps = solve_on_compact_layout(
+        gates, deadline=time.time() + 600, solver="g4"
+    )
+    assert len(steps) == len(expected)
+
+
+def test_deadline_stops_cadical_mid_solve():
+    # pigeonhole formulas keep CaDiCaL busy far longer than the deadline
+    with Solver(name="cd", bootstrap_with=PHP(11).clauses) as solver:
+        start = time.time()
+        assert solve_before(solver, start + 0.5) is None
+        assert time.time() - start < 5
@@ -0,0 +1,75 @@
+import json
+import os
+from wisq.architecture import compact_layout
+from wisq.dascot import dump, streamed_route
+from wisq.sarouting import sim_anneal_route
+from wisq.schedule_file import SUMMARY_SUFFIX, ScheduleReader, read_summary
+
+GATES = [(0, 1), (2, 3), (4,), (1, 2), (5,), (0, 5), (3, 4), (2,), (1, 4)]
+
+
+def test_schedule_file_matches_json(tmp_path):
+    arch = compact_layout(6, magic_states="all_sides")
+    map = list(zip(range(6), arch["alg_qubits"]))
+    steps, annealing = sim_anneal_route(GATES, arch, map, 10, 0.1, 0.1, 1)
+    id_to_op = {id: "cx" if len(gate) == 2 else "tdg" for id, gate in enumerate(GATES)}
+    for path in (tmp_path / "out.json", tmp_path / "out.wsch"):
+        dump(arch, map, steps, id_to_op, str(path), GATES, annealing)
+    with open(tmp_path / "out.json") as f:
+        expected = json.load(f)
+    reader = ScheduleReader(str(tmp_path / "out.wsch"))
+    loaded = reader.to_dict()
+    assert json.loads(json.dumps(loaded)) == expected
+    assert len(reader) == len(steps)
+    assert [reader[k] for k in range(len(reader))] == expected["steps"]
+    assert reader[-1] == expected["steps"][-1]
+
+
+def test_summary_without_reading_the_schedule(tmp_path):
+    arch = compact_layout(6, magic_states="all_sides")
+    map = list(zip(range(6), arch["alg_qubits"]))
+    steps, annealing = sim_anneal_route(GATES, arch, map, 10, 0.1, 0.1, 1)
+    id_to_op = {id: "cx" if len(gate) == 2 else "t" for id, gate in enumerate(GATES)}
+    for path in (str(tmp_path / "out.json"), str(tmp_path / "out.wsch")):
+        dump(arch, map, steps, id_to_op, path, GATES, annealing, {"mode": "dascot"})
+        summary = read_summary(path)
+        assert summary["steps"] == len(steps) and summary["t_gates"] == 3
+        assert summary["metadata"] == {"mode": "dascot"}
+        assert summary["path_length"] == sum(
+            len(p) for step in steps for _, _, p in step
+        )
+        # without the summary file it is recomputed from the result
+        os.remove(path + SUMMARY_SUFFIX)
+        del summary["metadata"]
+        assert read_summary(path) == summary
+
+
+def test_streamed_steps_are_written_as_routed(tmp_path):
+    arch = compact_layout(6, magic_states="all_sides")
+    map = list(zip(range(6), arch["alg_qubits"]))
+    # past the deadline routing is greedy, so both runs route the same steps
+    steps, annealing = sim_anneal_route(
+        GATES, arch, map, 10, 0.1, 0.1, 1, deadline=0
+    )
+    id_to_op = {id: "cx" if len(gate) == 2 else "t" for id, gate in enumerate(GATES)}
+    path = str(tmp_path / "out.wsch")
+    efforts = []
+    stream = streamed_route(
+        GATES,
+        arch,
+        map,
+        efforts,
+        temperature=10,
+        cooling_rate=0.1,
+        termination_temp=0.1,
+        order_fraction=1,
+        deadline=0,
+    )
+    dump(arch, map, stream, id_to_op, path, GATES, efforts, start=0)
+    reader = ScheduleReader(path)
+    assert reader.annealing == efforts == annealing
+    read = [[(g["id"], tuple(g["qubits"]), g["path"]) for g in step] for step in reader]
+    assert read == [[(id, tuple(q), p) for id, q, p in step] for step in steps]
+    summary = read_summary(path)
+    assert summary["steps"] == len(steps) and summary["greedy_steps"] == len(steps)
+    assert summary["metadata"]["seconds"] > 0
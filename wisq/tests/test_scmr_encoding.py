@@ -0,0 +1,20 @@
+from wisq.scmr_encoding import VarLayout, gate_links
+
+
+def test_var_layout_decodes_its_ids(gates, compact_arch):
+    arch = compact_arch
+    face_num = arch["width"] * arch["height"]
+    links = gate_links(arch["width"], arch["height"], [], gates, arch["magic_states"])
+    layout = VarLayout(links, face_num, 4)
+    layout.extend(3)
+    aux = layout.pool.id()
+    layout.extend(5)
+    ids = set()
+    for vid, obj in layout.items():
+        name, *index = obj
+        assert getattr(layout, name)(*index) == vid
+        ids.add(vid)
+    assert aux not in ids and layout.obj(aux) is None
+    assert len(ids) == layout.top - 1
+    ids = sorted(ids)
+    assert layout.decode([-ids[0], aux] + ids) == [layout.obj(v) for v in ids]